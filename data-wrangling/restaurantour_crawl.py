@@ -0,0 +1,63 @@
+#The Restaurantour - Bounding Box Crawler
+
+#Foursquare place search over bounding boxes for Step 4 of restaurantour_data_wrangling.py.
+#A search returns at most limit places, so a box that comes back full is split into 4 quarters
+#that are searched again, until every box has fewer than limit results (or max_depth is reached).
+#The quarters share their edges, so places are deduped by fsq_id. All boxes of one level (for
+#every search) are requested together on the Fetcher's worker pool, within its rate limits.
+
+MAX_DEPTH = 6 #a box is split at most 6 times (1/64 of the original width and height)
+
+#bbox is (min lon, min lat, max lon, max lat), as in shapely's bounds:
+def split_bbox(bbox):
+    minx, miny, maxx, maxy = bbox
+    midx, midy = (minx + maxx) / 2, (miny + maxy) / 2
+    return [(minx,miny,midx,midy),(midx,miny,maxx,midy),(minx,midy,midx,maxy),(midx,midy,maxx,maxy)]
+
+def bbox_params(bbox):
+    return {
+        'sw': str(bbox[1]) + ',' + str(bbox[0]),
+        'ne': str(bbox[3]) + ',' + str(bbox[2])
+    }
+
+#searches is a list of (key, params, bbox), the search params without the box and limit (categories, ...).
+#Returns {key: {'results': [...]}} with the places of the whole box, each fsq_id once, ordered by
+#box (a split box's places come from its quarters, in split_bbox order). A key whose requests
+#fail is left out, like a failed single search:
+def crawl_places(fetcher,url,headers,searches,limit=50,max_depth=MAX_DEPTH):
+    tiles = {key: {} for key, params, bbox in searches} #key -> {path: results}
+    failed = set()
+    level = [(key,params,bbox,()) for key, params, bbox in searches]
+    search = lambda params, bbox: fetcher.get('fsq',url,params=dict(params,limit=limit,**bbox_params(bbox)),headers=headers)
+    while level:
+        responses = fetcher.map(search,[(params,bbox) for key, params, bbox, path in level])
+
+        next_level = []
+        for (key,params,bbox,path), response in zip(level,responses):
+            if key in failed:
+                continue
+            if response.status_code != 200:
+                print(key, path, 'bad status')
+                failed.add(key)
+                continue
+            results = response.json()['results']
+            if len(results) >= limit and len(path) < max_depth:
+                next_level += [(key,params,quarter,path + (q,)) for q, quarter in enumerate(split_bbox(bbox))]
+            else:
+                if len(results) >= limit:
+                    print(key, path, limit, 'results at the maximum depth, some places may be missing')
+                tiles[key][path] = results
+        level = next_level
+
+    places = {}
+    for key in tiles:
+        if key in failed:
+            continue
+        seen, results = set(), []
+        for path in sorted(tiles[key]):
+            for result in tiles[key][path]:
+                if result['fsq_id'] not in seen:
+                    seen.add(result['fsq_id'])
+                    results.append(result)
+        places[key] = {'results': results}
+    return places
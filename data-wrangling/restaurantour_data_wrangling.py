@@ -6,18 +6,40 @@
 #Step 4. Use the Foursquare API to collect information about other places in each neighborhood
 
 #load packages
-import requests
+import os
+import sys
 import numpy as np
 import pandas as pd
-from copy import deepcopy
 import pickle
-from shapely.geometry import Point, Polygon, MultiPolygon
+from itertools import chain
 from collections import defaultdict
+from restaurantour_localize import build_poly_index, locate_points
+from restaurantour_fetch import Fetcher
+from restaurantour_stream import batched, write_jsonl, read_jsonl, GroupReader, atomic_write
+from restaurantour_registry import IdRegistry, load_registry
+from restaurantour_crawl import crawl_places
+from restaurantour_density import set_places, density_frame
 
 #load map data:
 with open('df_map.pkl','rb') as f:
     df_map = pickle.load(f)
 
+#all API requests share one session, with per-provider rate limits and retries (see restaurantour_fetch.py).
+#Responses are cached in api_cache/ and reused for a week; after a crash, rerun with --resume
+#to reuse every cached response regardless of age:
+fetcher = Fetcher(cache_dir='api_cache',resume='--resume' in sys.argv)
+
+#neighborhoods whose places are searched again in Step 4, given after --recrawl:
+recrawl = []
+if '--recrawl' in sys.argv:
+    for arg in sys.argv[sys.argv.index('--recrawl') + 1:]:
+        if arg.startswith('--'):
+            break
+        recrawl.append(arg)
+for name in recrawl:
+    if name not in list(df_map['name']):
+        raise ValueError('cannot recrawl ' + name + ', it is not in df_map')
+
 #define functions
 def get_yelp_rests(URL,headers,location,offset,cat):
     params = {
@@ -28,10 +50,10 @@ def get_yelp_rests(URL,headers,location,offset,cat):
         'sort_by': 'rating',
         'categories': cat
     }
-    return requests.get(URL, params=params, headers=headers)
+    return fetcher.get('yelp', URL, params=params, headers=headers)
 
 def get_yelp_details(rest_url,headers,cuisine,rest_name):
-    response = requests.get(rest_url, headers=headers)
+    response = fetcher.get('yelp', rest_url, headers=headers)
     if response.status_code != 200:
         print(cuisine, rest_name, 'bad status')
         return []
@@ -39,7 +61,7 @@ def get_yelp_details(rest_url,headers,cuisine,rest_name):
         return response.json()
 
 def get_yelp_reviews(reviews_url,headers,cuisine,rest_name):
-    response = requests.get(reviews_url, headers=headers)
+    response = fetcher.get('yelp', reviews_url, headers=headers)
     if response.status_code != 200:
         print(cuisine, rest_name, 'bad status')
         return []
@@ -51,7 +73,7 @@ def get_fsq_id(fs_url,fs_headers,cuisine,rest_name,lat,long):
         "name": rest_name,
         "ll":  str(lat) + ',' +  str(long)
     }
-    response = requests.get(fs_url, params=params, headers=fs_headers)
+    response = fetcher.get('fsq', fs_url, params=params, headers=fs_headers)
     if response.status_code != 200:
         print(cuisine, rest_name, 'bad status')
         return []
@@ -62,82 +84,251 @@ def get_fsq_fields(fs_url,fsq_id,fs_headers,fields,cuisine,rest_name):
     params = {
         'fields': fields
     }
-    response = requests.get(fs_url + fsq_id, params=params, headers=fs_headers)
+    response = fetcher.get('fsq', fs_url + fsq_id, params=params, headers=fs_headers)
     if response.status_code != 200:
         print(cuisine, rest_name, 'bad status')
         return []
     else:
         return response.json()
     
-def add_rest_to_df(rest,df_rests):
-    df_rests.loc[loc,'yelp_id'] = rest['id']
+#flat record (column -> value) for a restaurant, with only the columns it has data for;
+#the missing ones are filled with NaN when the records are turned into a df:
+def flatten_rest(rest):
+    record = {
+        'yelp_id': rest['id'],
+        'yelp_name': rest['name'],
+        'yelp_categories': [c['title'] for c in rest['categories']],
+        'neighborhood': rest['neighborhood'],
+        'latitude': rest['coordinates']['latitude'],
+        'longitude': rest['coordinates']['longitude'],
+        'address1': rest['location']['address1'],
+        'address2': rest['location']['address2'],
+        'city': rest['location']['city'],
+        'state': rest['location']['state'],
+        'zip_code': rest['location']['zip_code'],
+        'display_address': rest['location']['display_address'],
+        'display_phone': rest['display_phone'],
+        'yelp_rating': rest['rating'],
+        'yelp_review_count': rest['review_count']
+    }
     if 'fsq_id' in rest:
-        df_rests.loc[loc,'fsq_id'] = rest['fsq_id']
-    df_rests.loc[loc,'yelp_name'] = rest['name']
-    cats = []
-    for c in rest['categories']:
-        cats.append(c['title'])
-    df_rests.loc[loc,'yelp_categories'] = cats
-    df_rests.loc[loc,'neighborhood'] = rest['neighborhood']
-    df_rests.loc[loc,'latitude'] = rest['coordinates']['latitude']
-    df_rests.loc[loc,'longitude'] = rest['coordinates']['longitude']
-    df_rests.loc[loc,'address1'] = rest['location']['address1']
-    df_rests.loc[loc,'address2'] = rest['location']['address2']
-    df_rests.loc[loc,'city'] = rest['location']['city']
-    df_rests.loc[loc,'state'] = rest['location']['state']
-    df_rests.loc[loc,'zip_code'] = rest['location']['zip_code']
-    df_rests.loc[loc,'display_address'] = rest['location']['display_address']
-    df_rests.loc[loc,'display_phone'] = rest['display_phone']
+        record['fsq_id'] = rest['fsq_id']
     if 'hours' in rest:
-        df_rests.loc[loc,'hours_type'] = rest['hours'][0]['hours_type']
-        df_rests.loc[loc,'hours_open'] = rest['hours'][0]['open']
+        record['hours_type'] = rest['hours'][0]['hours_type']
+        record['hours_open'] = rest['hours'][0]['open']
     if 'is_claimed' in rest:
-        df_rests.loc[loc,'yelp_is_claimed'] = rest['is_claimed']
+        record['yelp_is_claimed'] = rest['is_claimed']
     if 'price' in rest:
-        df_rests.loc[loc,'yelp_price'] = rest['price']
-    df_rests.loc[loc,'yelp_rating'] = rest['rating']
-    df_rests.loc[loc,'yelp_review_count'] = rest['review_count']
-
-    if 'four square data' in rest:
-        if rest['four square data']:
-            fsrest = rest['four square data'] #used below for readability
-            df_rests.loc[loc,'fsq_name'] = fsrest['name']
-            cats = []
-            for c in fsrest['categories']:
-                cats.append(c['name'])
-            df_rests.loc[loc,'fsq_categories'] = cats
-            df_rests.loc[loc,'census_block'] = fsrest['location']['census_block']
-            df_rests.loc[loc,'fsq_address'] = fsrest['location']['formatted_address']
-
-            if 'hours_popular' in fsrest:
-                df_rests.loc[loc,'fsq_hours_popular'] = fsrest['hours_popular']
-            if 'display' in fsrest['hours']:
-                df_rests.loc[loc,'fsq_hours_display'] = fsrest['hours']['display']
-            if fsrest['chains']:
-                df_rests.loc[loc,'is_chain'] = 1
+        record['yelp_price'] = rest['price']
+
+    if rest.get('four square data'):
+        fsrest = rest['four square data'] #used below for readability
+        record['fsq_name'] = fsrest['name']
+        record['fsq_categories'] = [c['name'] for c in fsrest['categories']]
+        record['census_block'] = fsrest['location']['census_block']
+        record['fsq_address'] = fsrest['location']['formatted_address']
+        if 'hours_popular' in fsrest:
+            record['fsq_hours_popular'] = fsrest['hours_popular']
+        if 'display' in fsrest['hours']:
+            record['fsq_hours_display'] = fsrest['hours']['display']
+        record['is_chain'] = 1 if fsrest['chains'] else 0
+        record['fsq_verified'] = fsrest['verified']
+        for key in ['popularity','price','rating','tastes']:
+            if key in fsrest:
+                record['fsq_' + key] = fsrest[key]
+        for key in ['total_photos','total_ratings','total_tips']:
+            if key in fsrest.get('stats',{}):
+                record['fsq_' + key] = fsrest['stats'][key]
+        if 'features' in fsrest:
+            record['fsq_features'] = [fsrest['features']]
+        if 'website' in fsrest:
+            record['website'] = fsrest['website']
+    return record
+
+#search result pages (lists of businesses) for each (location, category) in searches, fetched concurrently.
+#The first page gives the total, then the remaining pages (up to 1000 results, in sets of 50)
+#are requested together. Each response is parsed once; the pages of each search are kept in
+#offset order and stop at the first empty one:
+def get_yelp_pages(URL,headers,searches,offsets):
+    first = fetcher.map(get_yelp_rests,[(URL,headers,location,offsets[0],cat) for location, cat in searches])
+    first = [response.json() if response.status_code == 200 else None for response in first]
+    jobs = []
+    for (location, cat), page in zip(searches,first):
+        total = page.get('total',0) if page is not None else offsets[-1] + 1
+        jobs += [(location,cat,offset) for offset in offsets[1:] if offset < total]
+    rest = fetcher.map(get_yelp_rests,[(URL,headers,location,offset,cat) for location, cat, offset in jobs])
+
+    results = {search: [page] for search, page in zip(searches,first)}
+    for (location, cat, offset), response in zip(jobs,rest):
+        results[(location,cat)].append(response.json() if response.status_code == 200 else None)
+    pages = {}
+    for (location, cat), search_pages in results.items():
+        pages[(location,cat)] = []
+        for page in search_pages:
+            if page is None:
+                print(location, cat, 'bad status')
+            elif page['businesses']:
+                pages[(location,cat)].append(page['businesses'])
             else:
-                df_rests.loc[loc,'is_chain'] = 0
-            df_rests.loc[loc,'fsq_verified'] = fsrest['verified']
-            if 'popularity' in fsrest:
-                df_rests.loc[loc,'fsq_popularity'] = fsrest['popularity']
-            if 'price' in fsrest:
-                df_rests.loc[loc,'fsq_price'] = fsrest['price']
-            if 'rating' in fsrest:
-                df_rests.loc[loc,'fsq_rating'] = fsrest['rating']
-            if 'stats' in fsrest:
-                if 'total_photos' in fsrest['stats']:
-                    df_rests.loc[loc,'fsq_total_photos'] = fsrest['stats']['total_photos']
-                if 'total_ratings' in fsrest['stats']:
-                    df_rests.loc[loc,'fsq_total_ratings'] = fsrest['stats']['total_ratings']
-                if 'total_tips' in fsrest['stats']:
-                    df_rests.loc[loc,'fsq_total_tips'] = fsrest['stats']['total_tips']
-            if 'tastes' in fsrest:
-                df_rests.loc[loc,'fsq_tastes'] = fsrest['tastes']
-            if 'features' in fsrest:
-                df_rests.loc[loc,'fsq_features'] = [fsrest['features']]
-            if 'website' in fsrest:
-                df_rests.loc[loc,'website'] = fsrest['website']
-    return df_rests
+                break
+    return pages
+
+#localize the restaurants of a cleaned dict into neighborhoods (all at once, see restaurantour_localize.py):
+def localize_rests(rest_dict,poly_index,neigh_names,num_rests_neighborhood):
+    to_locate = []
+    for cuisine in rest_dict:
+        for rest in rest_dict[cuisine]:
+            if not rest['remove']: #if not already flagged for removal
+                if 'coordinates' in rest:
+                    rest['neighborhood'] = []
+                    if rest['coordinates']['latitude'] and rest['coordinates']['longitude']:
+                        to_locate.append((cuisine,rest))
+                else:
+                    print(cuisine, rest['name'], 'no coords') #never prints, every location had a lat/long
+
+    found = locate_points(poly_index,
+                          [rest['coordinates']['longitude'] for cuisine, rest in to_locate],
+                          [rest['coordinates']['latitude'] for cuisine, rest in to_locate])
+    for (cuisine, rest), poly_ids in zip(to_locate,found):
+        for i in poly_ids:
+            rest['neighborhood'].append(neigh_names[i])
+            num_rests_neighborhood[neigh_names[i] + '_' + cuisine] += 1
+
+#Steps 1-3 run as a stream of restaurants, one category at a time:
+#search pages -> clean -> Yelp/Foursquare details -> flag -> localize -> stage file (one JSON line each)
+#Only one category's search pages and one batch of restaurants are held in memory.
+
+#restaurants from the search pages of a category in each of the locations, in location order. The
+#pages of all the locations are requested together (see get_yelp_pages):
+def search_rests(locations,cat):
+    searches = [(location,cat) for location in locations]
+    pages = get_yelp_pages(URL,headers,searches,offsets)
+    for search in searches:
+        for businesses in pages[search]:
+            yield from businesses
+
+#skip restaurants that are permanently closed and remove extra fields:
+def clean_rests(rests):
+    for rest in rests:
+        if not rest['is_closed']:
+            for k in remove_keys: #remove unneeded keys
+                rest.pop(k, None)
+            yield rest
+
+#drop restaurants already found in the Los Angeles search or in this category (of the missing cities):
+def new_rests(cuisine,rests,registry):
+    for rest in rests:
+        if not registry.has('la',rest['id']):
+            if registry.add('missing:' + cuisine,rest['id']):
+                yield rest
+
+#restaurants of the missing cities kept from the previous run (with their details), except the ones
+#the Los Angeles search has found since:
+def kept_rests(cuisine,rests,registry):
+    for rest in rests:
+        if registry.has('la',rest['id']):
+            registry.discard('missing:' + cuisine,rest['id'])
+        else:
+            registry.add('missing:' + cuisine,rest['id']) #already there unless the registry is older than the stage file
+            yield rest
+
+#add the Yelp details and reviews and the Foursquare data, BATCH_SIZE restaurants at a time
+#(the requests for each batch are sent concurrently, the results are added in order):
+def add_details(cuisine,rests):
+    for batch in batched(rests,BATCH_SIZE):
+        todo = [rest for rest in batch if 'is_claimed' not in rest]
+        results = fetcher.map(get_yelp_details,[(details_url + rest['id'],headers,cuisine,rest['name']) for rest in todo])
+        for rest, resp_json in zip(todo,results):
+            if resp_json:
+                for key in added_keys:
+                    if key in resp_json:
+                        rest[key] = resp_json[key]
+
+        # also add the 3 review samples from Yelp API
+        todo = [rest for rest in batch if 'reviews' not in rest]
+        results = fetcher.map(get_yelp_reviews,[(details_url + rest['id'] + '/reviews',headers,cuisine,rest['name']) for rest in todo])
+        for rest, resp_json in zip(todo,results):
+            if 'reviews' in resp_json:
+                rest['reviews'] = resp_json['reviews']
+
+        # add Foursquare id to match Yelp info
+        todo = [rest for rest in batch if 'fsq_id' not in rest]
+        results = fetcher.map(get_fsq_id,[(fs_match_url,fs_headers,cuisine,rest['name'],rest['coordinates']['latitude'],rest['coordinates']['longitude'])
+                                          for rest in todo])
+        for rest, resp_json in zip(todo,results):
+            if 'fsq_id' in resp_json:
+                rest['fsq_id'] = resp_json['fsq_id']
+            elif 'fsq_id' in resp_json['place']:
+                rest['fsq_id'] = resp_json['place']['fsq_id']
+
+        # add Foursquare field data
+        todo = [rest for rest in batch if 'four square data' not in rest and 'fsq_id' in rest]
+        results = fetcher.map(get_fsq_fields,[(fs_places_url,rest['fsq_id'],fs_headers,fields,cuisine,rest['name']) for rest in todo])
+        for rest, resp_json in zip(todo,results):
+            if 'name' in resp_json:
+                rest['four square data'] = resp_json
+        yield from batch
+
+# identify mismatched restaurants between Yelp vs. Foursquare info
+# also flag for removal restaurants without an address or outside LA county
+def flag_rests(rests):
+    for rest in rests:
+        if type(rest['location']['address1']) == None.__class__: #likely a food truck
+            #add a tag to ignore this entry
+            rest['remove'] = 1
+        elif rest['location']['address1'] == '': #another way it can be empty
+            rest['remove'] = 1
+        else:
+            rest['remove'] = 0
+            if 'four square data' in rest:
+                if rest['name'] != rest['four square data']['name']:
+                    if 'location' in rest['four square data']:
+                        if 'address' in rest['four square data']['location']:
+                            #split the address to compare just the number:
+                            yelp_address = rest['location']['address1'].split()
+                            fs_address = rest['four square data']['location']['address'].split()
+                            if yelp_address[0] != fs_address[0]:
+                                rest['four square data'] = {} #remove
+                                rest['fsq_id'] = 'mismatch'
+
+        #do some additional cleaning based on state and city:
+        if rest['location']['state']:
+            if rest['location']['state'] != 'CA':
+                rest['remove'] = 1
+        if rest['location']['city']:
+            if rest['location']['city'] in outside_cities:
+                rest['remove'] = 1
+        yield rest
+
+#localize the restaurants into neighborhoods, BATCH_SIZE at a time:
+def localize_stream(cuisine,rests):
+    for batch in batched(rests,BATCH_SIZE):
+        localize_rests({cuisine: batch},poly_index,neigh_names,num_rests_neighborhood)
+        yield from batch
+
+#special cases in the Los Angeles search (c is the position of the restaurant in its category):
+def flag_special_cases(cuisine,rests):
+    for c, rest in enumerate(rests):
+        #tradamerican Sea Salt Fish & Chips loc 274 count 2 - location is actually closed
+        if cuisine == 'tradamerican' and c == 274:
+            rest['remove'] = 1
+        yield rest
+
+def place_special_cases(cuisine,rests):
+    for c, rest in enumerate(rests):
+        #mediterranean Gyro Spot Los Angeles loc 427 is supposed to be in West LA
+        if cuisine == 'mediterranean' and c == 427:
+            if not rest['remove'] and 'coordinates' in rest:
+                rest['neighborhood'].append('West Los Angeles')
+                num_rests_neighborhood['West Los Angeles' + '_' + cuisine] += 1
+        yield rest
+
+#count each restaurant once in the neighborhood totals (it can be in several categories):
+def count_rest(rest,registry,all_rests_neigh):
+    if not rest['remove']:
+        if registry.add('counted',rest['id']): #only count the first time it is encountered
+            for neigh in rest['neighborhood']:
+                all_rests_neigh[neigh] += 1
 
 #Step 1. Use the Yelp API to collect LA restaurant info
 URL = 'https://api.yelp.com/v3/businesses/search'
@@ -264,38 +455,11 @@ categories = [
     'wraps'
     ]
 
-#gather restaurants
-city = 'Los Angeles'
-rest_dict = {}
-for cat in categories:
-    cat_list = [] #to store the responses for each category
-    for offset in offsets:
-        response = get_yelp_rests(URL,headers,city,offset,cat)
-        if response.json()['businesses']:
-            cat_list.append(response)
-        else:
-            break
-    rest_dict[cat] = cat_list
-    
 # remove extra fields and restaurants that are permanently closed
 remove_keys = [
     'transactions'
     ]
 
-cleaned_dict = {}
-for cat in categories:
-    cat_resps = rest_dict[cat]
-    #create a new list of dicts for this category
-    cleaned_dict[cat] = []
-    for resp in cat_resps:
-        rests = resp.json()['businesses']
-        for rest in rests:
-            # first, check to make sure it is still open:
-            if not rest['is_closed']:
-                    for k in remove_keys: #remove unneeded keys
-                        rest.pop(k, None)
-                    cleaned_dict[cat].append(rest)
-                    
 # add additional details for these restaurants from Yelp API
 added_keys = [
     'is_claimed',
@@ -305,82 +469,25 @@ added_keys = [
     ]
 
 details_url = 'https://api.yelp.com/v3/businesses/'
-for cuisine in cleaned_dict:
-    for rest in cleaned_dict[cuisine]:
-        if 'is_claimed' not in rest:
-            resp_json = get_yelp_details(details_url + rest['id'],headers,cuisine,rest['name'])
-            if resp_json:
-                for key in added_keys:
-                    if key in resp_json:
-                        rest[key] = resp_json[key]
-                        
-# also add the 3 review samples from Yelp API
-for cuisine in cleaned_dict:
-    for rest in cleaned_dict[cuisine]:
-        if 'reviews' not in rest:
-            reviews_url = details_url + rest['id'] + '/reviews'
-            resp_json = get_yelp_reviews(reviews_url,headers,cuisine,rest['name'])
-            if 'reviews' in resp_json:
-                rest['reviews'] = resp_json['reviews']
-                
+
+#restaurants are processed (and their requests sent) in batches of:
+BATCH_SIZE = 200
+
 #Step 2. Use the Foursquare API to collect additional info for each restaurant 
 
-fs_url = 'https://api.foursquare.com/v3/places/match'
+fs_match_url = 'https://api.foursquare.com/v3/places/match'
 fs_api_key = 'private' #replace with real api key
 fs_headers = {
         "Accept": "application/json",
         "Authorization": fs_api_key
     }
 
-# add Foursquare id to match Yelp info
-for cuisine in cleaned_dict:
-    for rest in cleaned_dict[cuisine]:
-        if 'fsq_id' not in rest:
-            resp_json = get_fsq_id(fs_url,fs_headers,cuisine,rest['name'],rest['coordinates']['latitude'],rest['coordinates']['longitude'])
-            if 'fsq_id' in resp_json:
-                rest['fsq_id'] = resp_json['fsq_id']
-            elif 'fsq_id' in resp_json['place']:
-                rest['fsq_id'] = resp_json['place']['fsq_id']
-                
-# add Foursquare field data
-fs_url = 'https://api.foursquare.com/v3/places/'
+# Foursquare field data
+fs_places_url = 'https://api.foursquare.com/v3/places/'
 fields = ('name,location,categories,chains,timezone,link,description,website,social_media,' +
           'verified,hours,hours_popular,rating,stats,popularity,price,menu,date_closed,photos,' +
           'tips,tastes,features')
 
-for cuisine in cleaned_dict:
-    for rest in cleaned_dict[cuisine]:
-        if 'four square data' not in rest:
-            if 'fsq_id' in rest:
-                resp_json = get_fsq_fields(fs_url,rest['fsq_id'],fs_headers,fields,cuisine,rest['name'])
-                if 'name' in resp_json:
-                    rest['four square data'] = resp_json
-                    
-# identify mismatched restaurants between Yelp vs. Foursquare info
-# also flag for removal restaurants without an address
-#create copy so do not overwrite in case there is an issue
-new_cleaned_dict = deepcopy(cleaned_dict)
-
-for cuisine in new_cleaned_dict:
-    for rest in new_cleaned_dict[cuisine]:
-        if type(rest['location']['address1']) == None.__class__: #likely a food truck
-            #add a tag to ignore this entry
-            rest['remove'] = 1
-        elif rest['location']['address1'] == '': #another way it can be empty
-            rest['remove'] = 1
-        else:
-            rest['remove'] = 0
-            if 'four square data' in rest:
-                if rest['name'] != rest['four square data']['name']:
-                    if 'location' in rest['four square data']:
-                        if 'address' in rest['four square data']['location']:
-                            #split the address to compare just the number:
-                            yelp_address = rest['location']['address1'].split()
-                            fs_address = rest['four square data']['location']['address'].split()
-                            if yelp_address[0] != fs_address[0]:
-                                rest['four square data'] = {} #remove
-                                rest['fsq_id'] = 'mismatch'
-                                
 #Step 3. Localize the restaurants into neighborhoods 
 #use the polygon boundary data from USC, found in df_map
 
@@ -395,53 +502,12 @@ outside_cities = ['Lake Forest','Stanton','Anaheim','Westminster','Newport Beach
                   'Thousand Oaks','San Diego']
 
 # boundaries are not perfectly drawn - need to add jitter to the coordinates to localize properly
-jitter = 0.00005
-
-for cuisine in new_cleaned_dict:
-    c = -1
-    for rest in new_cleaned_dict[cuisine]:
-        c += 1 #to keep track of the restaurant loc
-        #do some additional cleaning based on state and city:
-        if rest['location']['state']:
-            if rest['location']['state'] != 'CA':
-                rest['remove'] = 1
-        if rest['location']['city']:
-            if rest['location']['city'] in outside_cities:
-                rest['remove'] = 1
+# (JITTER in restaurantour_localize.py)
 
-        #special cases:
-        #tradamerican Sea Salt Fish & Chips loc 274 count 2 - location is actually closed
-        if cuisine == 'tradamerican' and c == 274:
-            rest['remove'] = 1
+#spatial index of the neighborhood polygons, shared by both localization passes:
+poly_index = build_poly_index(poly_list)
+neigh_names = list(df_map['name'])
 
-        if not rest['remove']: #if not already flagged for removal
-            #create a point for the lat/long:
-            if 'coordinates' in rest:
-                rest['neighborhood'] = []
-                if rest['coordinates']['latitude'] and rest['coordinates']['longitude']:
-                    #create multiple versions of the loc_points (original and with jitter = 5 total)
-                    loc_points = []
-                    loc_points.append(Point(rest['coordinates']['longitude'],rest['coordinates']['latitude']))
-                    loc_points.append(Point(rest['coordinates']['longitude']+jitter,rest['coordinates']['latitude']))
-                    loc_points.append(Point(rest['coordinates']['longitude']-jitter,rest['coordinates']['latitude']))
-                    loc_points.append(Point(rest['coordinates']['longitude'],rest['coordinates']['latitude']+jitter))
-                    loc_points.append(Point(rest['coordinates']['longitude'],rest['coordinates']['latitude']-jitter))
-
-                    for loc_point in loc_points:
-                        #now check to see if the point is within any neighborhood:
-                        for i, poly in enumerate(poly_list):
-                            if loc_point.within(poly):
-                                if df_map['name'][i] not in rest['neighborhood']:
-                                    rest['neighborhood'].append(df_map['name'][i])
-                                    num_rests_neighborhood[df_map['name'][i] + '_' + cuisine] += 1
-                #another special case:
-                if cuisine == 'mediterranean' and c == 427:
-                    #mediterranean Gyro Spot Los Angeles loc 427 is supposed to be in West LA
-                    rest['neighborhood'].append('West Los Angeles')
-                    num_rests_neighborhood['West Los Angeles' + '_' + cuisine] += 1
-            else:
-                print(cuisine, rest['name'], 'no coords') #never prints, every location had a lat/long
-                
 #calculate all restaurants in a neighborhood (since there could be overlap with the cuisine types)
 all_rests_neigh = {}
 
@@ -450,19 +516,42 @@ neighs = list(df_map['name'])
 for neigh in neighs:
     all_rests_neigh[neigh] = 0
 
-yelp_ids = {} #keep track of yelp ids, so do not double count restaurants
+#yelp ids seen so far, for every dedupe check of the collection (see restaurantour_registry.py):
+registry = IdRegistry()
+REGISTRY_FILE = 'rest_ids.json'
+MISSING_STAGE_FILE = 'rests_missing.jsonl'
 
-for cuisine in new_cleaned_dict:
-    for rest in new_cleaned_dict[cuisine]:
-        if not rest['remove']:
-            if rest['id'] not in yelp_ids:
-                yelp_ids[rest['id']] = 1
-            else:
-                yelp_ids[rest['id']] += 1
+#a rerun keeps the restaurants the previous run found in the missing cities: their ids carry over
+#from the saved registry and their records from the previous stage file, so only restaurants it
+#has not seen yet get their details fetched (delete rest_ids.json to collect everything again):
+previous_missing = None
+if os.path.exists(REGISTRY_FILE) and os.path.exists(MISSING_STAGE_FILE):
+    print(registry.merge(load_registry(REGISTRY_FILE).carried_over()), 'ids carried over from', REGISTRY_FILE)
+    previous_missing = GroupReader(read_jsonl(MISSING_STAGE_FILE),categories,'cuisine')
 
-            if yelp_ids[rest['id']] == 1: #only count the first time it is encountered
-                for neigh in rest['neighborhood']:
-                    all_rests_neigh[neigh] += 1
+#gather restaurants, one category at a time (Steps 1-3), and write them to the stage file:
+city = 'Los Angeles'
+LA_STAGE_FILE = 'rests_la.jsonl'
+
+def la_rests():
+    for cat in categories:
+        rests = search_rests([city],cat)
+        rests = clean_rests(rests)
+        rests = add_details(cat,rests)
+        rests = flag_rests(rests)
+        rests = flag_special_cases(cat,rests)
+        rests = localize_stream(cat,rests)
+        rests = place_special_cases(cat,rests)
+        for c, rest in enumerate(rests):
+            registry.add('la',rest['id']) #including removed ids
+            count_rest(rest,registry,all_rests_neigh)
+            #the very first entry is not actually a restaurant - remove it:
+            if cat == 'afghani' and c == 1:
+                rest['remove'] = 1 #family meat market
+            rest['cuisine'] = cat
+            yield rest
+
+print(write_jsonl(LA_STAGE_FILE,la_rests()), 'restaurants written to', LA_STAGE_FILE)
 
 # discovered: not all neighborhoods were found in the Los Angeles Yelp search
 # add in restaurants from these missing cities
@@ -550,160 +639,27 @@ missing_cities = [
     'Woodland Hills'
     ]
 
-missing_dict = {}
-for neigh in missing_cities:
-    if neigh not in missing_dict:
-        missing_dict[neigh] = {}
-        for cat in categories:
-            cat_list = []
-            for offset in offsets:
-                location = neigh + ', CA'
-                response = get_yelp_rests(URL,headers,location,offset,cat)
-                if response.status_code != 200:
-                    print(neigh, cat, 'bad status')
-                else:
-                    if response.json()['businesses']:
-                        cat_list.append(response)
-                    else:
-                        break
-            missing_dict[neigh][cat] = cat_list
-            
-#sort through the missing_dict to organize data based on category instead of area
-#do not allow duplicates
-missing_dict_cat = defaultdict(list)
-
-for neigh, val in missing_dict.items():
-    for cat,responses in val.items():
-        for resp in responses:
-            rests = resp.json()['businesses']
-            for rest in rests:
-                # first, check to make sure it is still open:
-                if not rest['is_closed']:
-                    rest_ids = [] #determine which restaurants already in the category
-                    for already in missing_dict_cat[cat]:
-                        rest_ids.append(already['id'])
-
-                    if rest['id'] not in rest_ids:
-                        #remove unneeded keys
-                        for k in remove_keys:
-                            rest.pop(k, None)
-                        missing_dict_cat[cat].append(rest)
-                        
-# remove restaurant entries that were already present in the new_cleaned_dict
-all_yelp_ids = {} #including removed ids
-
-for cat, val in new_cleaned_dict.items():
-    for rest in val:
-        if rest['id'] not in all_yelp_ids:
-            all_yelp_ids[rest['id']] = 1
-
-cleaned_missing_dict = defaultdict(list)
-
-for cat, val in missing_dict_cat.items():
-    for rest in val:
-        if rest['id'] not in all_yelp_ids:
-            cleaned_missing_dict[cat].append(rest)
-            
-#add in the yelp details and reviews to the cleaned_missing_dict
-for cuisine in cleaned_missing_dict:
-    for rest in cleaned_missing_dict[cuisine]:
-        if 'is_claimed' not in rest:
-            resp_json = get_yelp_details(details_url + rest['id'],headers,cuisine,rest['name'])
-            if resp_json:
-                for key in added_keys:
-                    if key in resp_json:
-                        rest[key] = resp_json[key]
-        if 'reviews' not in rest:
-            reviews_url = details_url + rest['id'] + '/reviews'
-            resp_json = get_yelp_reviews(reviews_url,headers,cuisine,rest['name'])
-            if 'reviews' in resp_json:
-                rest['reviews'] = resp_json['reviews']
-                
-#add the fsq data to the cleaned_missing_dict
-for cuisine in cleaned_missing_dict:
-    for rest in cleaned_missing_dict[cuisine]:
-        if 'fsq_id' not in rest:
-            resp_json = get_fsq_id(fs_url,fs_headers,cuisine,rest['name'],rest['coordinates']['latitude'],rest['coordinates']['longitude'])
-            if 'fsq_id' in resp_json:
-                rest['fsq_id'] = resp_json['fsq_id']
-            elif 'fsq_id' in resp_json['place']:
-                rest['fsq_id'] = resp_json['place']['fsq_id']
-        if 'four square data' not in rest:
-            if 'fsq_id' in rest:
-                resp_json = get_fsq_fields(fs_url,rest['fsq_id'],fs_headers,fields,cuisine,rest['name'])
-                if 'name' in resp_json:
-                    rest['four square data'] = resp_json
-                    
-#flag for removal rests without locations in cleaned_missing_dict, and check for yelp/fsq mistmatch
-for cuisine in cleaned_missing_dict:
-    for rest in cleaned_missing_dict[cuisine]:
-        if type(rest['location']['address1']) == None.__class__: #likely a food truck
-            #add a tag to ignore this entry
-            rest['remove'] = 1
-        elif rest['location']['address1'] == '': #another way it can be empty
-            rest['remove'] = 1
-        else:
-            rest['remove'] = 0
-            if 'four square data' in rest:
-                if rest['name'] != rest['four square data']['name']:
-                    if 'location' in rest['four square data']:
-                        if 'address' in rest['four square data']['location']:
-                            #split the address to compare just the number:
-                            yelp_address = rest['location']['address1'].split()
-                            fs_address = rest['four square data']['location']['address'].split()
-                            if yelp_address[0] != fs_address[0]:
-                                rest['four square data'] = {} #remove
-                                rest['fsq_id'] = 'mismatch'
-                                
-#add neighborhood data to cleaned_missing_dict
-for cuisine in cleaned_missing_dict:
-    c = -1
-    for rest in cleaned_missing_dict[cuisine]:
-        c += 1  #to keep track of the restaurant loc
-        #do some additional cleaning based on state and city:
-        if rest['location']['state']:
-            if rest['location']['state'] != 'CA':
-                rest['remove'] = 1
-        if rest['location']['city']:
-            if rest['location']['city'] in outside_cities:
-                rest['remove'] = 1
+#same stream for the missing cities, category by category: restaurants found in several cities
+#are kept once per category, and restaurants already found in the Los Angeles search are skipped.
+#The restaurants kept from the previous run come first in each category:
+def missing_rests():
+    for cat in categories:
+        rests = search_rests([neigh + ', CA' for neigh in missing_cities],cat)
+        rests = clean_rests(rests)
+        rests = new_rests(cat,rests,registry)
+        rests = add_details(cat,rests)
+        rests = flag_rests(rests)
+        if previous_missing is not None:
+            rests = chain(kept_rests(cat,previous_missing.group(cat),registry),rests)
+        rests = localize_stream(cat,rests)
+        for rest in rests:
+            # add missing rests to the total number of restaurants in each neighborhood:
+            count_rest(rest,registry,all_rests_neigh)
+            rest['cuisine'] = cat
+            yield rest
 
-        if not rest['remove']:  #if not already flagged for removal
-            #create a point for the lat/long:
-            if 'coordinates' in rest:
-                rest['neighborhood'] = []
-                if rest['coordinates']['latitude'] and rest['coordinates']['longitude']:
-                    #create multiple versions of the loc_points (original and with jitter - 5 total)
-                    loc_points = []
-                    loc_points.append(Point(rest['coordinates']['longitude'], rest['coordinates']['latitude']))
-                    loc_points.append(Point(rest['coordinates']['longitude'] + jitter, rest['coordinates']['latitude']))
-                    loc_points.append(Point(rest['coordinates']['longitude'] - jitter, rest['coordinates']['latitude']))
-                    loc_points.append(Point(rest['coordinates']['longitude'], rest['coordinates']['latitude'] + jitter))
-                    loc_points.append(Point(rest['coordinates']['longitude'], rest['coordinates']['latitude'] - jitter))
-
-                    for loc_point in loc_points:
-                        #now check to see if the point is within any neighborhood:
-                        for i, poly in enumerate(poly_list):
-                            if loc_point.within(poly):
-                                if df_map['name'][i] not in rest['neighborhood']:
-                                    rest['neighborhood'].append(df_map['name'][i])
-                                    num_rests_neighborhood[df_map['name'][i] + '_' + cuisine] += 1
-            else:
-                print(cuisine, rest['name'], 'no coords')  #never prints, every location had a lat/long
-                
-# add missing rests to the total number of restaurants in each neighborhood:
-for cuisine in cleaned_missing_dict:
-    for rest in cleaned_missing_dict[cuisine]:
-        if not rest['remove']:
-            if rest['id'] not in yelp_ids:
-                yelp_ids[rest['id']] = 1
-            else:
-                yelp_ids[rest['id']] += 1
+print(write_jsonl(MISSING_STAGE_FILE,missing_rests()), 'restaurants written to', MISSING_STAGE_FILE)
 
-            if yelp_ids[rest['id']] == 1: #only count the first time it is encountered
-                for neigh in rest['neighborhood']:
-                    all_rests_neigh[neigh] += 1
-                    
 #gather all restaurants together into a df
 df_columns = ['yelp_id',
               'fsq_id',
@@ -744,33 +700,37 @@ df_columns = ['yelp_id',
               'website'
               ]
 
-#the very first entry is not actually a restaurant - remove it:
-new_cleaned_dict['afghani'][1]['remove'] = 1 #family meat market
-
-df_rests = pd.DataFrame(columns = df_columns)
-
-loc = 0
-for cuisine in new_cleaned_dict:
-    for rest in new_cleaned_dict[cuisine]:
-        if not rest['remove']:
-            #check to see if a row exists for this restaurant:
-            if rest['id'] not in df_rests['yelp_id'].values:
-                df_rests = add_rest_to_df(rest,df_rests)
-                loc += 1
-                
-#above ends at loc = 11283; start from there to add missing rests
-loc = 11283 #the ending location of df_rests
-for cuisine in cleaned_missing_dict:
-    for rest in cleaned_missing_dict[cuisine]:
-        if not rest['remove']:
-            #check to see if a row exists for this restaurant:
-            if rest['id'] not in df_rests['yelp_id'].values:
-                df_rests = add_rest_to_df(rest,df_rests)
-                loc += 1
-                
-#save results
-with open('df_rests_all.pkl','wb') as f:
+#column dtypes (the others hold strings, lists or flags that can be missing, and stay object).
+#Counts that can be missing are float so they can hold NaN:
+df_dtypes = {
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'is_chain': 'float64',
+    'yelp_rating': 'float64',
+    'yelp_review_count': 'int64',
+    'fsq_popularity': 'float64',
+    'fsq_price': 'float64',
+    'fsq_rating': 'float64',
+    'fsq_total_photos': 'float64',
+    'fsq_total_ratings': 'float64',
+    'fsq_total_tips': 'float64'
+    }
+
+#flat records from the stage files (Los Angeles first, then the missing cities), each restaurant once:
+def flat_records(stage_files,registry):
+    for stage_file in stage_files:
+        for rest in read_jsonl(stage_file):
+            if not rest['remove'] and registry.add('table',rest['id']):
+                yield flatten_rest(rest)
+
+#one constructor call for the whole table:
+df_rests = pd.DataFrame.from_records(list(flat_records([LA_STAGE_FILE,MISSING_STAGE_FILE],registry)),columns=df_columns)
+df_rests = df_rests.astype(df_dtypes)
+
+#save results (with the id registry):
+with atomic_write('df_rests_all.pkl') as f:
     pickle.dump(df_rests, f)
+registry.save(REGISTRY_FILE)
     
 # Remove the northern neighborhoods from df_map (not processing restaurants in these less visited areas)
 remove_neighborhoods = ['Lancaster',
@@ -814,7 +774,7 @@ for ind in df_map.index:
 df_map_removed = df_map.query('remove == 0')
 
 #save the removed map:
-with open('df_map_removed.pkl','wb') as f:
+with atomic_write('df_map_removed.pkl') as f:
     pickle.dump(df_map_removed, f)
     
 #Step 4. Use the Foursquare API to collect information about other places in each neighborhood
@@ -852,80 +812,48 @@ fsq_categories_dict_reduced = {
     '19031': 'Travel and Transportation > Transport Hub > Airport'
     }
 
-neighborhood_places_dict = {}
+#hits tables of the neighborhoods by df_map position (see restaurantour_density.py), saved by the
+#previous run. A rerun only crawls the neighborhoods that have no table yet and the recrawl ones
+#(python restaurantour_data_wrangling.py --recrawl "Santa Monica" Venice), and keeps the tables
+#of the others:
+DENSITY_HITS_FILE = 'density_hits.pkl'
+density = {}
+if os.path.exists(DENSITY_HITS_FILE):
+    with open(DENSITY_HITS_FILE,'rb') as f:
+        density = pickle.load(f)
+
+#search the bounding box of each neighborhood for each category. Boxes with 50 results (the most
+#one search returns) are split until the results fit (see restaurantour_crawl.py). The northern
+#neighborhoods are not processed:
+crawl = [i for i, name in enumerate(df_map['name'])
+         if name not in remove_neighborhoods and (i not in density or name in recrawl)]
+neighborhood_places_dict = {df_map['name'][i]: {} for i in crawl}
+
+searches = []
+for i in crawl:
+    for key,val in fsq_categories_dict_reduced.items():
+        searches.append(((df_map['name'][i],val),{'categories': key},poly_list[i].bounds))
 
-for i, poly in enumerate(poly_list):
-    sw = str(poly.bounds[1]) + ',' + str(poly.bounds[0])
-    ne = str(poly.bounds[3]) + ',' + str(poly.bounds[2])
+for (name,val), places in crawl_places(fetcher,fs_url,fs_headers,searches).items():
+    neighborhood_places_dict[name][val] = places
+print('crawled', len(crawl), 'neighborhoods, kept', len(density) - len(set(crawl) & set(density)))
 
-    if df_map['name'][i] not in neighborhood_places_dict:
-        neighborhood_places_dict[df_map['name'][i]] = {}
-    for key,val in fsq_categories_dict_reduced.items():
-        if val not in neighborhood_places_dict[df_map['name'][i]]:
-            params = {
-                "categories": key,
-                "sw": sw,
-                'ne': ne,
-                "limit": 50
-            }
-            response = requests.get(fs_url, params=params, headers=fs_headers)
-            if response.status_code != 200:
-                print(i, key, val, 'bad status')
-            else:
-                neighborhood_places_dict[df_map['name'][i]][val] = response.json()
-                
 #Aggregating the other places data
-#key is the name of the neighborhood, for each entry go through and make sure it
-#is actually located in the correct poly. If it is, then add it to the count for
-#that category in the neighborhood
-
-#keep track of places fsq_ids to not double count
-fsq_ids = {}
-
-hood_loc = -1
-for hood, cats in neighborhood_places_dict.items():
-    hood_loc += 1
-    if hood not in remove_neighborhoods: #do not process the northern neighborhoods
-        for cat in cats:
-            if neighborhood_places_dict[hood][cat]['results']:
-                neighborhood_places_dict[hood][cat]['count'] = 0
-                if cat == 'Dining and Drinking > Cafes, Coffee, and Tea Houses > Coffee Shop': #split chains
-                    neighborhood_places_dict[hood][cat]['count_chains'] = 0
-                elif cat == 'Business and Professional Services > Financial Service > Banking and Finance': #split ATMs
-                    neighborhood_places_dict[hood][cat]['count_atms'] = 0
-
-                for result in neighborhood_places_dict[hood][cat]['results']:
-                    if result['fsq_id'] not in fsq_ids:
-                        fsq_ids[result['fsq_id']] = True
-                        if 'geocodes' in result:
-                            loc_points = []
-                            loc_points.append(Point(result['geocodes']['main']['longitude'],result['geocodes']['main']['latitude']))
-                            loc_points.append(Point(result['geocodes']['main']['longitude']+jitter,result['geocodes']['main']['latitude']))
-                            loc_points.append(Point(result['geocodes']['main']['longitude']-jitter,result['geocodes']['main']['latitude']))
-                            loc_points.append(Point(result['geocodes']['main']['longitude'],result['geocodes']['main']['latitude']+jitter))
-                            loc_points.append(Point(result['geocodes']['main']['longitude'],result['geocodes']['main']['latitude']-jitter))
-
-                            for loc_point in loc_points:
-                                #now check to see if the point is within the neighborhood:
-                                if loc_point.within(poly_list[hood_loc]):
-                                    if 'count' not in neighborhood_places_dict[hood][cat]:
-                                        neighborhood_places_dict[hood][cat]['count'] = 1
-                                    else:
-                                        neighborhood_places_dict[hood][cat]['count'] += 1
-
-                                    if cat == 'Dining and Drinking > Cafes, Coffee, and Tea Houses > Coffee Shop':
-                                        if result['chains']:
-                                            neighborhood_places_dict[hood][cat]['count_chains'] += 1
-
-                                    if cat == 'Business and Professional Services > Financial Service > Banking and Finance':
-                                        if 'ATM' in result['name']:
-                                            neighborhood_places_dict[hood][cat]['count_atms'] += 1
-                                            
-# store places info as a dataframe
-df_density = pd.DataFrame()
-
-#pulling out the bar and dessert cats so can combine for the first 5 entries (ran extra requests to Foursquare API)
-bar_cats = ['	Dining and Drinking > Bar > Beach Bar', #fix this later
+#for each crawled neighborhood, check which places are actually located in its polygon and replace
+#its hits table. The tables of all the neighborhoods are counted together below, each place
+#(fsq_id) only once, see restaurantour_density.py:
+for i in crawl:
+    set_places(density,poly_index,i,neighborhood_places_dict[df_map['name'][i]])
+for i in list(density):
+    if df_map['name'][i] in remove_neighborhoods: #do not process the northern neighborhoods
+        del density[i]
+
+with atomic_write(DENSITY_HITS_FILE) as f:
+    pickle.dump(density, f)
+
+#the bar and dessert subcategories are counted in the Bar and Dessert Shop columns (the first crawl
+#of the first 5 neighborhoods searched them separately):
+bar_cats = ['Dining and Drinking > Bar > Beach Bar',
             'Dining and Drinking > Bar > Beer Bar',
             'Dining and Drinking > Bar > Beer Garden',
             'Dining and Drinking > Bar > Champagne Bar',
@@ -956,61 +884,16 @@ dessert_cats = ['Dining and Drinking > Dessert Shop > Creperie',
                 'Dining and Drinking > Dessert Shop > Pastry Shop',
                 'Dining and Drinking > Dessert Shop > Pie Shop']
 
-count = -1
-for hood, cat in neighborhood_places_dict.items():
-    if hood not in remove_neighborhoods:
-        count += 1
-        df_density.loc[count,'name'] = hood
-        #add in the fsq density for other than rests:
-        for key in cat:
-            #special cases for the first 5 cities
-            if len(cat) == 162: #need to combine the bar and dessert categories
-                df_density.loc[count,'Bar'] = 0
-                df_density.loc[count,'Dessert Shop'] = 0
-                for bcat in bar_cats: #for the Bar categories
-                    if 'count' in cat[bcat]:
-                        df_density.loc[count,'Bar'] = df_density.loc[count,'Bar'] + cat[bcat]['count']
-
-                for dcat in dessert_cats: #for the dessert categories
-                    if 'count' in cat[dcat]:
-                        df_density.loc[count,'Dessert Shop'] = df_density.loc[count,'Dessert Shop'] + cat[dcat]['count']
-
-            #now for the rest of the categories:
-            if key in list(fsq_categories_dict_reduced.values()):
-                string_list = key.split('>')
-                cat_name = string_list[-1].strip()
-                if 'count' in cat[key]:
-                    df_density.loc[count,cat_name] = cat[key]['count']
-
-                    if key == 'Dining and Drinking > Cafes, Coffee, and Tea Houses > Coffee Shop':
-                        df_density.loc[count,cat_name + '_chains'] = cat[key]['count_chains']
-                        df_density.loc[count,cat_name + '_indie'] = cat[key]['count'] - cat[key]['count_chains']
-
-                    if key == 'Business and Professional Services > Financial Service > Banking and Finance':
-                        df_density.loc[count,cat_name + '_atms'] = cat[key]['count_atms']
-                        df_density.loc[count,cat_name + '_banks'] = cat[key]['count'] - cat[key]['count_atms']
-                else:
-                    #there are none, set to 0
-                    df_density.loc[count,cat_name] = 0
-                    if key == 'Dining and Drinking > Cafes, Coffee, and Tea Houses > Coffee Shop':
-                        df_density.loc[count,cat_name + '_chains'] = 0
-                        df_density.loc[count,cat_name + '_indie'] = 0
-                    if key == 'Business and Professional Services > Financial Service > Banking and Finance':
-                        df_density.loc[count,cat_name + '_atms'] = 0
-                        df_density.loc[count,cat_name + '_banks'] = 0
-
-        #now, also add in the total number of restaurants, and the num restaurants for each cuisine
-        for cuisine in categories:
-            if hood + '_' + cuisine not in num_rests_neighborhood:
-                df_density.loc[count,'Restaurant_' + cuisine] = 0
-            else:
-                df_density.loc[count,'Restaurant_' + cuisine] = num_rests_neighborhood[hood + '_' + cuisine]
-        #total number of restaurants
-        if hood not in all_rests_neigh:
-            df_density.loc[count,'Restaurant_total'] = 0
-        else:
-            df_density.loc[count,'Restaurant_total'] = all_rests_neigh[hood]
-            
+# store places info as a dataframe, with the number of restaurants for each cuisine and in total:
+df_density = density_frame(density,list(df_map['name']),list(fsq_categories_dict_reduced.values()),
+                           groups={'Bar': bar_cats, 'Dessert Shop': dessert_cats})
+df_rest_counts = pd.DataFrame(
+    [[num_rests_neighborhood.get(hood + '_' + cuisine,0) for cuisine in categories] + [all_rests_neigh.get(hood,0)]
+     for hood in df_density['name']],
+    columns=['Restaurant_' + cuisine for cuisine in categories] + ['Restaurant_total'],
+    dtype='float64')
+df_density = pd.concat([df_density,df_rest_counts],axis=1)
+
 #save df_density
-with open('df_density.pkl','wb') as f:
+with atomic_write('df_density.pkl') as f:
     pickle.dump(df_density, f)
\ No newline at end of file
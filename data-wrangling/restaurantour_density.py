@@ -0,0 +1,103 @@
+#The Restaurantour - Neighborhood Densities
+
+#Counts of other places (Foursquare categories) in each neighborhood, for Step 4 of
+#restaurantour_data_wrangling.py. The search results of each neighborhood are turned into a
+#table of hits, one row per result: how many of the place's 5 points are inside the neighborhood
+#(0 to 5, see restaurantour_localize.py), and whether it is a chain (coffee shops) or an ATM
+#(banks). The count matrix is then built from all the tables in one pass.
+#
+#A place is only counted for the first neighborhood and category it was found in (neighborhoods
+#in df_map order, then categories and results in search order), even when none of its points are
+#inside that neighborhood. Every neighborhood keeps its own table, so after re-crawling some
+#neighborhoods only their tables are replaced (set_places) before the matrix is rebuilt.
+
+import numpy as np
+import pandas as pd
+from restaurantour_localize import count_within_points
+
+COFFEE_SHOP = 'Dining and Drinking > Cafes, Coffee, and Tea Houses > Coffee Shop'
+BANKING = 'Business and Professional Services > Financial Service > Banking and Finance'
+
+#extra columns for a category: (flagged, not flagged)
+SPLITS = {
+    COFFEE_SHOP: ('chains','indie'),
+    BANKING: ('atms','banks')
+}
+
+def split_flag(label,result):
+    if label == COFFEE_SHOP:
+        return bool(result['chains'])
+    if label == BANKING:
+        return 'ATM' in result['name']
+    return False
+
+#'Dining and Drinking > Bar' -> 'Bar'
+def column_name(label):
+    return label.split('>')[-1].strip()
+
+#hits table of one neighborhood (position i in df_map), places is {category label: search response}:
+def hood_hits(poly_index,i,places):
+    rows = {'fsq_id': [], 'label': [], 'cat_order': [], 'order': [], 'flag': [], 'lon': [], 'lat': []}
+    for cat_order, (label, found) in enumerate(places.items()):
+        for order, result in enumerate(found['results']):
+            rows['fsq_id'].append(result['fsq_id'])
+            rows['label'].append(label)
+            rows['cat_order'].append(cat_order)
+            rows['order'].append(order)
+            rows['flag'].append(split_flag(label,result))
+            if 'geocodes' in result: #places without a location are never inside (but still count as found)
+                rows['lon'].append(result['geocodes']['main']['longitude'])
+                rows['lat'].append(result['geocodes']['main']['latitude'])
+            else:
+                rows['lon'].append(np.nan)
+                rows['lat'].append(np.nan)
+    hits = pd.DataFrame(rows)
+    hits['hits'] = count_within_points(poly_index,i,hits['lon'].values,hits['lat'].values) if len(hits) else 0
+    return {'labels': list(places), 'hits': hits.drop(columns=['lon','lat'])}
+
+#add or replace the hits of neighborhood i in density ({df_map position: hits table}):
+def set_places(density,poly_index,i,places):
+    density[i] = hood_hits(poly_index,i,places)
+
+#density columns of every neighborhood in density, in df_map order. labels are the searched
+#categories (one column each, plus their SPLITS columns), groups adds more labels to a column
+#({column: [labels]}). A column is NaN for a neighborhood where none of its labels were searched:
+def density_frame(density,hood_names,labels,groups=None):
+    columns, label_columns, split_columns = [], {}, {}
+    for label in labels:
+        label_columns[label] = len(columns)
+        columns.append(column_name(label))
+        if label in SPLITS:
+            split_columns[label] = len(columns)
+            columns += [column_name(label) + '_' + suffix for suffix in SPLITS[label]]
+    for column, extra_labels in (groups or {}).items():
+        for label in extra_labels:
+            label_columns.setdefault(label,columns.index(column))
+
+    hoods = sorted(density)
+    counts = np.full((len(hoods),len(columns)),np.nan)
+    for row, i in enumerate(hoods):
+        for label in density[i]['labels']:
+            if label in label_columns:
+                counts[row,label_columns[label]] = 0
+            if label in split_columns:
+                counts[row,split_columns[label]:split_columns[label] + 2] = 0
+
+    if hoods:
+        hits = pd.concat([density[i]['hits'].assign(row=row) for row, i in enumerate(hoods)],ignore_index=True)
+        #the tables are in (neighborhood, category, result) order, so the first row of a place is where it is counted:
+        hits = hits[~hits['fsq_id'].duplicated() & (hits['hits'] > 0)]
+        col = hits['label'].map(label_columns)
+        counted = col.notna().values
+        rows, cols, num = hits['row'].values[counted], col.values[counted].astype(int), hits['hits'].values[counted]
+        np.add.at(counts,(rows,cols),num)
+
+        for label, split_col in split_columns.items():
+            split = (hits['label'] == label).values
+            flag = hits['flag'].values.astype(bool)
+            np.add.at(counts,(hits['row'].values[split & flag],split_col),hits['hits'].values[split & flag])
+            np.add.at(counts,(hits['row'].values[split & ~flag],split_col + 1),hits['hits'].values[split & ~flag])
+
+    df = pd.DataFrame(counts,columns=columns)
+    df.insert(0,'name',[hood_names[i] for i in hoods])
+    return df
@@ -0,0 +1,175 @@
+#The Restaurantour - API Fetcher
+
+#Concurrent, rate-limited GET requests for the Yelp and Foursquare collection in
+#restaurantour_data_wrangling.py. All threads share one requests.Session (its connection pool
+#is sized to the number of workers), each provider has its own token bucket, and 429/5xx
+#responses and connection errors are retried with exponential backoff (Retry-After is used
+#when the server sends it). URLs are plain arguments, so a Fetcher can be pointed at a local
+#stub server.
+#
+#With a cache_dir, successful responses are also written to disk, one file per request, named
+#by a hash of (provider, url, params) (headers are not part of the key, they hold the API keys).
+#A rerun or a restart after a crash gets them from disk instead of the API: entries older than
+#the ttl are fetched again, except in resume mode, where every cached response is used.
+
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from restaurantour_stream import atomic_write
+
+#requests per second and burst size for each provider:
+RATE_LIMITS = {
+    'yelp': {'rate': 5, 'burst': 5},
+    'fsq': {'rate': 10, 'burst': 10}
+}
+
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+BACKOFF = 0.5 #seconds before the first retry, doubled on every retry
+TIMEOUT = 30
+RETRY_STATUS = [429, 500, 502, 503, 504]
+CACHE_TTL = 7 * 24 * 3600 #seconds
+
+#cache file name for a request:
+def cache_key(provider,url,params=None):
+    params = sorted((str(key),str(value)) for key, value in (params or {}).items())
+    request = json.dumps([provider,url,params],separators=(',',':'))
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+#successful responses on disk (cache_dir/ab/abcd...json):
+class ResponseCache:
+    def __init__(self,cache_dir,ttl=CACHE_TTL,resume=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.resume = resume
+
+    def path(self,key):
+        return os.path.join(self.cache_dir,key[:2],key + '.json')
+
+    #cached requests.Response, or None if missing or expired:
+    def get(self,key):
+        try:
+            with open(self.path(key),'r') as f:
+                entry = json.load(f)
+        except (OSError,ValueError): #missing, or a partial file
+            return None
+        if not self.resume and time.time() - entry['fetched'] > self.ttl:
+            return None
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.url = entry['url']
+        response.encoding = 'utf-8'
+        response._content = entry['body'].encode('utf-8')
+        response.headers['Content-Type'] = entry['content_type']
+        return response
+
+    #written with atomic_write, so an interrupted run never leaves a partial entry:
+    def put(self,key,response):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        entry = {
+            'url': response.url,
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type',''),
+            'body': response.content.decode('utf-8'),
+            'fetched': time.time()
+        }
+        with atomic_write(path,'w') as f:
+            json.dump(entry,f)
+
+#allows rate requests per second on average, and up to burst at once:
+class TokenBucket:
+    def __init__(self,rate,burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    #block until a request can be sent:
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst,self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class Fetcher:
+    def __init__(self,rate_limits=RATE_LIMITS,max_workers=MAX_WORKERS,max_retries=MAX_RETRIES,backoff=BACKOFF,timeout=TIMEOUT,
+                 cache_dir=None,cache_ttl=CACHE_TTL,resume=False):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(rate_limits),pool_maxsize=max_workers)
+        self.session.mount('http://',adapter)
+        self.session.mount('https://',adapter)
+        self.buckets = {provider: TokenBucket(**limits) for provider, limits in rate_limits.items()}
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_dir,cache_ttl,resume) if cache_dir else None
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'retries': 0, 'cache_hits': 0}
+
+    def count(self,key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def retry_delay(self,attempt,retry_after=None):
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * 2 ** attempt * random.uniform(0.5,1.5)
+
+    #GET from the cache, or from the API (and cached if successful):
+    def get(self,provider,url,params=None,headers=None):
+        if self.cache is None:
+            return self.fetch(provider,url,params,headers)
+        key = cache_key(provider,url,params)
+        response = self.cache.get(key)
+        if response is not None:
+            self.count('cache_hits')
+            return response
+        response = self.fetch(provider,url,params,headers)
+        if response.status_code == 200:
+            self.cache.put(key,response)
+        return response
+
+    #GET with the provider's rate limit, retrying 429/5xx responses and connection errors.
+    #Returns the last response (which can still be an error) or raises the last connection error:
+    def fetch(self,provider,url,params=None,headers=None):
+        attempt = 0
+        while True:
+            self.buckets[provider].acquire()
+            self.count('requests')
+            try:
+                response = self.session.get(url,params=params,headers=headers,timeout=self.timeout)
+            except (requests.ConnectionError,requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    return response
+                delay = self.retry_delay(attempt,response.headers.get('Retry-After'))
+            self.count('retries')
+            time.sleep(delay)
+            attempt += 1
+
+    #fn(*args) for every args tuple in jobs, at most max_workers at a time, results in job order:
+    def map(self,fn,jobs):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda args: fn(*args),jobs))
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
@@ -0,0 +1,70 @@
+#The Restaurantour - Neighborhood Localization
+
+#Point-in-polygon assignment of places to neighborhoods, shared by the localization passes
+#of restaurantour_data_wrangling.py. The neighborhood boundaries are not perfectly drawn, so
+#each place is tested as 5 points: the original location and 4 jittered copies.
+#A place gets every polygon that contains any of its points, in the same order as the original
+#loop (points in jitter order, then polygons in df_map order), without repeats.
+#
+#Both passes are a vectorized bounding box scan: for each polygon, the points are prefiltered
+#with numpy against its bounding box and only the points that pass are tested with a vectorized
+#contains.
+#locate_points: every polygon containing any of the 5 points of each place
+#count_within_points: number of the 5 points of each place inside one polygon
+
+import numpy as np
+from shapely import vectorized
+
+JITTER = 0.00005
+
+#(dx, dy) of the 5 test points, in the order they were checked in the original loop:
+JITTER_OFFSETS = [(0,0),(1,0),(-1,0),(0,1),(0,-1)]
+
+#the polygons and their bounding boxes (poly_list is list(df_map['polygon'])):
+def build_poly_index(poly_list):
+    return {
+        'polygons': poly_list,
+        'bounds': np.array([poly.bounds for poly in poly_list],dtype=np.float64) #minx, miny, maxx, maxy
+    }
+
+#number of jittered points of each place inside polygon i (0 to 5):
+def count_within_points(poly_index,i,lons,lats,jitter=JITTER):
+    lons = np.asarray(lons,dtype=np.float64)
+    lats = np.asarray(lats,dtype=np.float64)
+    xs = np.concatenate([lons + dx*jitter for dx, dy in JITTER_OFFSETS])
+    ys = np.concatenate([lats + dy*jitter for dx, dy in JITTER_OFFSETS])
+    minx, miny, maxx, maxy = poly_index['bounds'][i]
+    candidates = np.flatnonzero((xs >= minx) & (xs <= maxx) & (ys >= miny) & (ys <= maxy))
+    inside = np.zeros(len(xs),dtype=bool)
+    inside[candidates] = vectorized.contains(poly_index['polygons'][i],xs[candidates],ys[candidates])
+    return inside.reshape(len(JITTER_OFFSETS),len(lons)).sum(axis=0)
+
+#polygon positions containing any of the jittered points of each place, one list per place:
+def locate_points(poly_index,lons,lats,jitter=JITTER):
+    lons = np.asarray(lons,dtype=np.float64)
+    lats = np.asarray(lats,dtype=np.float64)
+    xs = np.concatenate([lons + dx*jitter for dx, dy in JITTER_OFFSETS])
+    ys = np.concatenate([lats + dy*jitter for dx, dy in JITTER_OFFSETS])
+    num_places = len(lons)
+
+    hit_points, hit_polys = [], []
+    for i, (minx, miny, maxx, maxy) in enumerate(poly_index['bounds']):
+        candidates = np.flatnonzero((xs >= minx) & (xs <= maxx) & (ys >= miny) & (ys <= maxy))
+        if len(candidates) == 0:
+            continue
+        inside = candidates[vectorized.contains(poly_index['polygons'][i],xs[candidates],ys[candidates])]
+        hit_points.append(inside)
+        hit_polys.append(np.full(len(inside),i))
+    found = [[] for _ in range(num_places)]
+    if not hit_points:
+        return found
+    hit_points = np.concatenate(hit_points)
+    hit_polys = np.concatenate(hit_polys)
+
+    #order the hits by place, then jitter point, then polygon (the original loop order):
+    places, jitters = hit_points % num_places, hit_points // num_places
+    order = np.lexsort((hit_polys,jitters,places))
+    for place, i in zip(places[order].tolist(),hit_polys[order].tolist()):
+        if i not in found[place]:
+            found[place].append(i)
+    return found
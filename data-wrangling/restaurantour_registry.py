@@ -0,0 +1,74 @@
+#The Restaurantour - Id Registry
+
+#Yelp ids seen by the collection passes of restaurantour_data_wrangling.py, in named sets so that
+#every dedupe check is a set lookup:
+#   'la'           every open restaurant from the Los Angeles search (including the removed ones)
+#   'counted'      restaurants already counted in the neighborhood totals
+#   'table'        restaurants already added to df_rests
+#   'missing:cat'  restaurants from the missing cities kept for category cat (the ones in the
+#                  missing cities stage file)
+#The registry is saved next to df_rests_all.pkl and loaded by the next run, which merges the sets
+#that carry over (carried_over): only the 'missing:cat' sets, which go together with the missing
+#cities stage file the next run keeps. The restaurants in them are not fetched again, new results
+#are only checked against the sets. The other sets describe what one run did and are rebuilt by
+#every run: carrying over 'counted' would leave the neighborhood totals at 0 and 'table' would
+#drop every row of df_rests, and an old 'la' would skip restaurants that left the Los Angeles search.
+
+import json
+from restaurantour_stream import atomic_write
+
+REGISTRY_FORMAT = 1
+
+#named sets that stay valid from one run to the next (by prefix):
+CARRIED_SETS = ('missing:',)
+
+class IdRegistry:
+    def __init__(self,ids=None):
+        self.ids = {name: set(values) for name, values in (ids or {}).items()}
+
+    #add rest_id to the named set, True if it was not there yet:
+    def add(self,name,rest_id):
+        ids = self.ids.setdefault(name,set())
+        if rest_id in ids:
+            return False
+        ids.add(rest_id)
+        return True
+
+    def has(self,name,rest_id):
+        return rest_id in self.ids.get(name,())
+
+    def discard(self,name,rest_id):
+        self.ids.get(name,set()).discard(rest_id)
+
+    #union with another registry, returns the number of ids that were new:
+    def merge(self,other):
+        added = 0
+        for name, values in other.ids.items():
+            ids = self.ids.setdefault(name,set())
+            before = len(ids)
+            ids |= values
+            added += len(ids) - before
+        return added
+
+    #registry with only the sets that carry over to the next run:
+    def carried_over(self):
+        return IdRegistry({name: ids for name, ids in self.ids.items() if name.startswith(CARRIED_SETS)})
+
+    def counts(self):
+        return {name: len(ids) for name, ids in self.ids.items()}
+
+    #sorted JSON lists, written with atomic_write:
+    def save(self,path):
+        data = {
+            'format': REGISTRY_FORMAT,
+            'ids': {name: sorted(ids) for name, ids in sorted(self.ids.items())}
+        }
+        with atomic_write(path,'w') as f:
+            json.dump(data,f)
+
+def load_registry(path):
+    with open(path,'r') as f:
+        data = json.load(f)
+    if data.get('format') != REGISTRY_FORMAT:
+        raise ValueError('{} has registry format {}, expected {}'.format(path,data.get('format'),REGISTRY_FORMAT))
+    return IdRegistry(data['ids'])
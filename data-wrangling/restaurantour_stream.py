@@ -0,0 +1,66 @@
+#The Restaurantour - Stream Helpers
+
+#Helpers for the streaming collection in restaurantour_data_wrangling.py: records go through
+#the stages one at a time (or one batch at a time) and are written to a JSON lines stage file
+#as they come out, so memory use does not grow with the number of searches.
+
+import os
+import json
+import threading
+from itertools import islice
+from contextlib import contextmanager
+
+#lists of up to size items:
+def batched(items,size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items,size))
+        if not batch:
+            return
+        yield batch
+
+#file object for writing path ('w' or 'wb'), written under a temporary name (per process and
+#thread, the cache threads can write the same path) and renamed to path when the block ends without
+#an error. Used for every file the wrangling pipeline writes (the app modules have their own in
+#restaurantour_files.py):
+@contextmanager
+def atomic_write(path,mode='wb'):
+    tmp_path = '{}.{}.{}.tmp'.format(path,os.getpid(),threading.get_ident())
+    try:
+        with open(tmp_path,mode) as f:
+            yield f
+        os.replace(tmp_path,path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+#write the records one JSON line at a time. The file is written with atomic_write, so an
+#interrupted run never leaves a partial stage file:
+def write_jsonl(path,records):
+    count = 0
+    with atomic_write(path,'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+            count += 1
+    return count
+
+def read_jsonl(path):
+    with open(path,'r') as f:
+        for line in f:
+            yield json.loads(line)
+
+#records of a stage file that was written one group at a time (e.g. one category at a time, in
+#the order of keys), read once from start to end: group(key) yields the records of that group,
+#skipping the records of the groups before it and of groups that are not in keys:
+class GroupReader:
+    def __init__(self,records,keys,key_field):
+        self.order = {key: i for i, key in enumerate(keys)}
+        self.records = iter(records)
+        self.key_field = key_field
+        self.pending = next(self.records,None)
+
+    def group(self,key):
+        while self.pending is not None and self.order.get(self.pending[self.key_field],-1) <= self.order[key]:
+            record, self.pending = self.pending, next(self.records,None)
+            if record[self.key_field] == key:
+                yield record
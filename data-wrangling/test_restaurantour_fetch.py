@@ -0,0 +1,128 @@
+#The Restaurantour - API Fetcher Tests
+
+#Runs the Fetcher against a local stub HTTP server (http.server on a free port): retries of
+#429/5xx responses, token bucket pacing and the on-disk response cache.
+#
+#Run with:  python -m pytest data-wrangling
+
+import json
+import time
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from restaurantour_fetch import Fetcher, TokenBucket
+
+#statuses the stub answers with for a path, one per request (the last one is repeated):
+STUB_REPLIES = {
+    '/ok': [200],
+    '/flaky': [429,503,200],
+    '/down': [500]
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        with self.server.lock:
+            self.server.requests.append((path,time.monotonic()))
+            count = sum(1 for seen, _ in self.server.requests if seen == path)
+        replies = STUB_REPLIES[path]
+        status = replies[min(count,len(replies)) - 1]
+        body = json.dumps({'path': path, 'count': count}).encode('utf-8')
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After','0')
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,format,*args):
+        pass
+
+class FetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1',0),StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever,kwargs={'poll_interval': 0.01},daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetcher(self,rate=1000,burst=1000,**kwargs):
+        return Fetcher(rate_limits={'stub': {'rate': rate, 'burst': burst}},backoff=0.01,**kwargs)
+
+    def requests_to(self,path):
+        return [t for seen, t in self.server.requests if seen == path]
+
+    def test_retries_429_and_5xx(self):
+        fetcher = self.fetcher()
+        response = fetcher.get('stub',self.url + '/flaky')
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()['count'],3)
+        self.assertEqual(fetcher.stats()['retries'],2)
+
+    def test_returns_last_error_after_max_retries(self):
+        fetcher = self.fetcher(max_retries=2)
+        response = fetcher.get('stub',self.url + '/down')
+        self.assertEqual(response.status_code,500)
+        self.assertEqual(len(self.requests_to('/down')),3)
+
+    def test_token_bucket_paces_requests(self):
+        fetcher = self.fetcher(rate=20,burst=2,max_workers=4)
+        start = time.monotonic()
+        responses = fetcher.map(lambda i: fetcher.get('stub',self.url + '/ok',params={'i': i}),[(i,) for i in range(8)])
+        elapsed = time.monotonic() - start
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        #2 requests right away, then one every 1/20 s:
+        self.assertGreaterEqual(elapsed,(8 - 2) / 20 * 0.9)
+        times = sorted(self.requests_to('/ok'))
+        self.assertGreaterEqual(times[-1] - times[0],(8 - 2) / 20 * 0.9)
+
+    def test_token_bucket_allows_burst(self):
+        bucket = TokenBucket(rate=1,burst=5)
+        start = time.monotonic()
+        for i in range(5):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start,0.5)
+
+    def test_cache_hit(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            fetcher = self.fetcher(cache_dir=cache_dir)
+            first = fetcher.get('stub',self.url + '/ok',params={'q': 'tacos'})
+            second = fetcher.get('stub',self.url + '/ok',params={'q': 'tacos'})
+            self.assertEqual(second.status_code,200)
+            self.assertEqual(second.json(),first.json())
+            self.assertEqual(len(self.requests_to('/ok')),1)
+            self.assertEqual(fetcher.stats()['cache_hits'],1)
+            #another request is not a hit:
+            fetcher.get('stub',self.url + '/ok',params={'q': 'pizza'})
+            self.assertEqual(len(self.requests_to('/ok')),2)
+
+    def test_cache_expiry_and_resume(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.fetcher(cache_dir=cache_dir).get('stub',self.url + '/ok')
+            time.sleep(0.05)
+            #expired entries are fetched again:
+            self.fetcher(cache_dir=cache_dir,cache_ttl=0.01).get('stub',self.url + '/ok')
+            self.assertEqual(len(self.requests_to('/ok')),2)
+            #except in resume mode:
+            time.sleep(0.05)
+            fetcher = self.fetcher(cache_dir=cache_dir,cache_ttl=0.01,resume=True)
+            self.assertEqual(fetcher.get('stub',self.url + '/ok').json()['count'],2)
+            self.assertEqual(len(self.requests_to('/ok')),2)
+
+    def test_errors_are_not_cached(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            fetcher = self.fetcher(cache_dir=cache_dir,max_retries=0)
+            fetcher.get('stub',self.url + '/down')
+            fetcher.get('stub',self.url + '/down')
+            self.assertEqual(len(self.requests_to('/down')),2)
+            self.assertEqual(fetcher.stats()['cache_hits'],0)
+
+if __name__ == '__main__':
+    unittest.main()
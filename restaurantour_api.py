@@ -0,0 +1,84 @@
+#The Restaurantour - JSON API
+
+#Lightweight HTTP endpoint for the recommendations, alongside the Streamlit UI. No map rendering:
+#only the restaurant data and restaurantour_core are loaded (numpy, no pandas/folium/streamlit).
+#
+#Run with:  python restaurantour_api.py [port]
+#
+#GET /recommendations?neighborhood=Santa Monica&cuisine=Seafood&price=$$&top_n=3&offset=0
+#    -> {"neighborhood": ..., "cuisine": ..., "price": ..., "top_n": 3, "offset": 0,
+#        "results": [restaurant records], "next_offset": 3 (null on the last page)}
+#GET /health
+#    -> {"status": "ok", "restaurants": 8708}
+
+import sys
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from restaurantour_data import load_rest_data
+from restaurantour_store import num_rests
+from restaurantour_core import recommend, TOP_N
+
+API_PORT = 8502
+MAX_TOP_N = 50
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    def send_json(self,status,body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == '/recommendations':
+            self.get_recommendations(params)
+        elif url.path == '/health':
+            self.send_json(200,{'status': 'ok', 'restaurants': num_rests(load_rest_data()['rest_store'])})
+        else:
+            self.send_json(404,{'error': 'not found: ' + url.path})
+
+    def get_recommendations(self,params):
+        neigh_choice = params.get('neighborhood','')
+        cuisine_choice = params.get('cuisine','')
+        price_choice = params.get('price','')
+        try:
+            top_n = params.get('top_n',str(TOP_N))
+            if not top_n.isdigit() or not 1 <= int(top_n) <= MAX_TOP_N:
+                raise ValueError('top_n must be a number between 1 and {}'.format(MAX_TOP_N))
+            top_n = int(top_n)
+            offset = params.get('offset','0')
+            if not offset.isdigit():
+                raise ValueError('offset must be a number of at least 0')
+            offset = int(offset)
+            #one extra result tells whether there is a next page:
+            results = recommend(load_rest_data(),neigh_choice,cuisine_choice,price_choice,top_n + 1,offset)
+        except ValueError as e:
+            self.send_json(400,{'error': str(e)})
+            return
+        self.send_json(200,{
+            'neighborhood': neigh_choice,
+            'cuisine': cuisine_choice,
+            'price': price_choice,
+            'top_n': top_n,
+            'offset': offset,
+            'results': results[:top_n],
+            'next_offset': offset + top_n if len(results) > top_n else None
+        })
+
+    #keep the default per-request logging off stderr:
+    def log_message(self,format,*args):
+        pass
+
+def make_server(host='',port=API_PORT):
+    load_rest_data() #load before accepting requests
+    return ThreadingHTTPServer((host,port),RecommendationHandler)
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else API_PORT
+    server = make_server(port=port)
+    print('serving recommendations on port', port)
+    server.serve_forever()
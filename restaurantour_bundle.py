@@ -0,0 +1,463 @@
+#The Restaurantour - Data Bundle Compiler
+
+#Builds every data file the app loads from the wrangling outputs in data-wrangling/datasets, in
+#one command:
+#   rest_store.json, rest_top_k.json, rest_columns/   restaurant store (with the Bayesian ratings) and top k index
+#   neigh_cuisines_dict.json, neigh_prices_dict.json, cuisine_prices_dict.json,
+#   neigh_cuisine_prices_dict.json        sidebar options
+#   clusters_dict.json, clusters_label_dict.json   neighborhood clusters (from the clustering notebook)
+#   la_neighborhoods_gj_z10.json, la_neighborhoods_gj_z13.json   geometry tiers
+#   cluster_map.html                      pre-rendered landing page map (stamped, see restaurantour_data.py)
+#df_rests_all is the master table written by data-wrangling/restaurantour_data_wrangling.py.
+#The restaurant selection of the ratings adjustment notebook is applied to df_rests_all, and the
+#selected rows are scanned once for the store records, the posting lists and the sidebar options,
+#so the files can not disagree with each other. Without a master table (it is not shipped, run the
+#wrangling script first), the bundle is compiled from the shipped outputs of the ratings adjustment
+#notebook instead (SHIPPED_FILES): its restaurant records, ratings and option dicts are kept as
+#they are.
+#Rating updates added with python restaurantour_ratings.py updates.json are kept in
+#RATING_UPDATES_FILE, a source of the bundle, and applied on top of the compiled ratings.
+#
+#bundle_manifest.json lists the sha256 of every source and built file. A file whose content did
+#not change is not rewritten (the app reloads files when their mtime changes), and
+#python restaurantour_bundle.py --check reports files that no longer match the manifest.
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+from collections import defaultdict
+from restaurantour_store import build_store, store_from_records, store_files, PRICES
+from restaurantour_index import build_top_k_index, index_files, TOP_K, OPTION_NAMES
+from restaurantour_ratings import rescore_store, update_ratings
+from restaurantour_clusters import build_cluster_lookup
+from restaurantour_geometry import build_geometry_tier, tier_file, GEOMETRY_TIERS
+from restaurantour_format import data_bytes
+from restaurantour_data import render_cluster_map_file, cluster_map_stamp, CLUSTER_MAP_FILE, CLUSTER_MAP_SOURCES
+from restaurantour_files import atomic_write, write_bytes
+
+BUNDLE_FORMAT = 1
+
+MANIFEST_FILE = 'bundle_manifest.json'
+
+DATASETS = 'data-wrangling/datasets/'
+SOURCE_FILES = {
+    'df_rests_all': 'data-wrangling/df_rests_all.pkl',
+    'clusters_dict': DATASETS + 'clusters_dict.pkl',
+    'clusters_label_dict': DATASETS + 'clusters_label_dict.pkl',
+    'la_neighborhoods_gj': DATASETS + 'la_neighborhoods_gj.json'
+    }
+#the shipped notebook outputs used in place of df_rests_all:
+REST_DICTS = ['rest_neigh_dict','rest_cuisine_dict','rest_price_dict']
+SHIPPED_FILES = {name: DATASETS + name + '.pkl' for name in REST_DICTS + OPTION_NAMES}
+#{yelp_id: {'yelp_rating': ..., 'yelp_review_count': ...}}, see restaurantour_ratings.py:
+RATING_UPDATES_FILE = 'data-wrangling/rating_updates.json'
+
+#restaurant selection (ratings adjustment notebook):
+MIN_RATING = 4.0 #yelp rating of at least 4
+MIN_REVIEWS = 20 #more than 20 yelp reviews
+
+#cuisines offered in the sidebar:
+CUISINES = [
+    'Acai Bowls',
+    'Afghan',
+    'African',
+    'American (New)',
+    'American (Traditional)',
+    'Arabic',
+    'Argentine',
+    'Armenian',
+    'Asian Fusion',
+    'Australian',
+    'Bagels',
+    'Bakeries',
+    'Bangladeshi',
+    'Barbeque',
+    'Bars',
+    'Basque',
+    'Beer Gardens',
+    'Belgian',
+    'Brasseries',
+    'Brazilian',
+    'Breakfast & Brunch',
+    'Breweries',
+    'Brewpubs',
+    'British',
+    'Bubble Tea',
+    'Buffets',
+    'Burgers',
+    'Burmese',
+    'Cafes',
+    'Cajun/Creole',
+    'Cambodian',
+    'Cantonese',
+    'Caribbean',
+    'Cheesesteaks',
+    'Chicken Shop',
+    'Chicken Wings',
+    'Chinese',
+    'Cocktail Bars',
+    'Coffee & Tea',
+    'Coffee Roasteries',
+    'Colombian',
+    'Comfort Food',
+    'Conveyor Belt Sushi',
+    'Creperies',
+    'Cuban',
+    'Cupcakes',
+    'Delis',
+    'Desserts',
+    'Dim Sum',
+    'Diners',
+    'Dinner Theater',
+    'Dive Bars',
+    'Donuts',
+    'Empanadas',
+    'Ethiopian',
+    'Falafel',
+    'Farmers Market',
+    'Fast Food',
+    'Filipino',
+    'Fish & Chips',
+    'Fondue',
+    'Food Stands',
+    'Food Trucks',
+    'French',
+    'Gastropubs',
+    'Gelato',
+    'Georgian',
+    'German',
+    'Gluten-Free',
+    'Greek',
+    'Hainan',
+    'Halal',
+    'Hawaiian',
+    'Himalayan/Nepalese',
+    'Honduran',
+    'Hong Kong Style Cafe',
+    'Hookah Bars',
+    'Hot Dogs',
+    'Hot Pot',
+    'Ice Cream & Frozen Yogurt',
+    'Indian',
+    'Indonesian',
+    'Irish',
+    'Irish Pub',
+    'Italian',
+    'Izakaya',
+    'Japanese',
+    'Japanese Curry',
+    'Juice Bars & Smoothies',
+    'Karaoke',
+    'Kebab',
+    'Korean',
+    'Kosher',
+    'Laotian',
+    'Latin American',
+    'Lebanese',
+    'Live/Raw Food',
+    'Malaysian',
+    'Mediterranean',
+    'Mexican',
+    'Middle Eastern',
+    'Modern European',
+    'Mongolian',
+    'Moroccan',
+    'New Mexican Cuisine',
+    'Nicaraguan',
+    'Noodles',
+    'Pakistani',
+    'Pan Asian',
+    'Pancakes',
+    'Pasta Shops',
+    'Patisserie/Cake Shop',
+    'Persian/Iranian',
+    'Peruvian',
+    'Piano Bars',
+    'Pizza',
+    'Poke',
+    'Polish',
+    'Polynesian',
+    'Pop-Up Restaurants',
+    'Portuguese',
+    'Poutineries',
+    'Pretzels',
+    'Pubs',
+    'Puerto Rican',
+    'Ramen',
+    'Russian',
+    'Salad',
+    'Salvadoran',
+    'Sandwiches',
+    'Sardinian',
+    'Scandinavian',
+    'Seafood',
+    'Seafood Markets',
+    'Shanghainese',
+    'Shaved Ice',
+    'Sicilian',
+    'Singaporean',
+    'Smokehouse',
+    'Somali',
+    'Soul Food',
+    'Soup',
+    'South African',
+    'Southern',
+    'Spanish',
+    'Speakeasies',
+    'Sports Bars',
+    'Sri Lankan',
+    'Steakhouses',
+    'Street Vendors',
+    'Supper Clubs',
+    'Sushi Bars',
+    'Syrian',
+    'Szechuan',
+    'Tacos',
+    'Taiwanese',
+    'Tapas Bars',
+    'Tapas/Small Plates',
+    'Tea Rooms',
+    'Teppanyaki',
+    'Tex-Mex',
+    'Thai',
+    'Themed Cafes',
+    'Tiki Bars',
+    'Trinidadian',
+    'Turkish',
+    'Tuscan',
+    'Ukrainian',
+    'Uzbek',
+    'Vegan',
+    'Vegetarian',
+    'Venezuelan',
+    'Vietnamese',
+    'Waffles',
+    'Whiskey Bars',
+    'Wine Bars',
+    'Wine Tasting Room',
+    'Wineries',
+    'Wraps'
+    ]
+
+SCAN_COLUMNS = ['yelp_id','yelp_name','yelp_categories','neighborhood','latitude','longitude','display_address',
+                'display_phone','yelp_price','yelp_rating','yelp_review_count','website']
+
+#restaurants with a neighborhood, claimed on yelp, rated at least MIN_RATING, not chains and with
+#more than MIN_REVIEWS reviews:
+def select_rests(df_rests_all):
+    keep = df_rests_all['neighborhood'].apply(len) > 0
+    keep &= df_rests_all['yelp_is_claimed'] == True
+    keep &= df_rests_all['yelp_rating'] >= MIN_RATING
+    keep &= df_rests_all['is_chain'] != 1
+    keep &= df_rests_all['yelp_review_count'] > MIN_REVIEWS
+    return df_rests_all[keep]
+
+#one pass over the selected restaurants: store records (row ids in table order), posting lists
+#and the sidebar option sets:
+def scan_rests(df_rests):
+    cuisines = set(CUISINES)
+    records = []
+    postings = {'neigh_postings': {}, 'cuisine_postings': {}, 'price_postings': {}}
+    options = {'neigh_cuisines': {}, 'neigh_prices': {}, 'cuisine_prices': {}, 'neigh_cuisine_prices': {}}
+    for values in df_rests[SCAN_COLUMNS].itertuples(index=False,name=None):
+        (yelp_id, name, categories, neighborhoods, lat, long, display_address,
+         display_phone, price, yelp_rating, yelp_review_count, website) = values
+        price = price if price in PRICES else None
+        row = len(records)
+        records.append({
+            'yelp_id': yelp_id,
+            'name': name,
+            'neighborhood': list(neighborhoods),
+            'categories': list(categories),
+            'price': price,
+            'yelp_rating': yelp_rating,
+            'yelp_review_count': yelp_review_count,
+            'bayes_yelp_rating': float('NaN'), #filled in by rescore_store
+            'lat': lat,
+            'long': long,
+            'display_address': display_address,
+            'display_phone': display_phone,
+            'website': website
+        })
+
+        menu = [cat for cat in categories if cat in cuisines]
+        for cat in categories:
+            postings['cuisine_postings'].setdefault(cat,[]).append(row)
+        if price:
+            postings['price_postings'].setdefault(price,[]).append(row)
+            for cat in menu:
+                options['cuisine_prices'].setdefault(cat,set()).add(price)
+        for neigh in neighborhoods:
+            postings['neigh_postings'].setdefault(neigh,[]).append(row)
+            options['neigh_cuisines'].setdefault(neigh,set()).update(menu)
+            options['neigh_prices'].setdefault(neigh,set())
+            if price:
+                options['neigh_prices'][neigh].add(price)
+                for cat in menu:
+                    options['neigh_cuisine_prices'].setdefault(neigh + '_' + cat,set()).add(price)
+    return records, postings, options
+
+#the four sidebar option dicts, same layout as the ones saved by the ratings adjustment notebook:
+def build_option_dicts(options):
+    neigh_cuisines_dict = defaultdict(list)
+    neigh_cuisines_dict['All'] = list(CUISINES)
+    neigh_prices_dict = defaultdict(list)
+    neigh_prices_dict['All'] = list(PRICES)
+    for neigh in options['neigh_cuisines']:
+        neigh_cuisines_dict[neigh] = sorted(options['neigh_cuisines'][neigh])
+        neigh_prices_dict[neigh] = sorted(options['neigh_prices'][neigh])
+    cuisine_prices_dict = defaultdict(list)
+    cuisine_prices_dict['All'] = list(PRICES)
+    for cuisine in CUISINES:
+        cuisine_prices_dict[cuisine] = sorted(options['cuisine_prices'].get(cuisine,()))
+    neigh_cuisine_prices_dict = defaultdict(list)
+    neigh_cuisine_prices_dict['All'] = list(PRICES)
+    for key, prices in options['neigh_cuisine_prices'].items():
+        neigh_cuisine_prices_dict[key] = sorted(prices)
+    return {
+        'neigh_cuisines_dict': neigh_cuisines_dict,
+        'neigh_prices_dict': neigh_prices_dict,
+        'cuisine_prices_dict': cuisine_prices_dict,
+        'neigh_cuisine_prices_dict': neigh_cuisine_prices_dict
+    }
+
+def read_bytes(path):
+    with open(path,'rb') as f:
+        return f.read()
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+#SOURCE_FILES, or the shipped notebook outputs if there is no master table, and the rating updates:
+def bundle_sources():
+    if os.path.exists(SOURCE_FILES['df_rests_all']):
+        sources = dict(SOURCE_FILES)
+    else:
+        sources = {name: path for name, path in SOURCE_FILES.items() if name != 'df_rests_all'}
+        sources.update(SHIPPED_FILES)
+    if os.path.exists(RATING_UPDATES_FILE):
+        sources['rating_updates'] = RATING_UPDATES_FILE
+    return sources
+
+#contents of every bundle file ({file name: bytes}) built from the source files:
+def compile_bundle(sources=SOURCE_FILES,k=TOP_K):
+    #the notebook outputs are pickles, the cluster numbers may be numpy ints:
+    clusters_dict = pickle.loads(read_bytes(sources['clusters_dict']))
+    clusters_dict = {'cluster': {neigh: int(cluster) for neigh, cluster in clusters_dict['cluster'].items()}}
+    clusters_label_dict = pickle.loads(read_bytes(sources['clusters_label_dict']))
+    clusters_label_dict = {label: list(neighs) for label, neighs in clusters_label_dict.items()}
+    gj = json.loads(read_bytes(sources['la_neighborhoods_gj']))
+    cluster_lookup = build_cluster_lookup({},clusters_dict)
+
+    if 'df_rests_all' in sources:
+        df_rests_all = pickle.loads(read_bytes(sources['df_rests_all']))
+        records, postings, options = scan_rests(select_rests(df_rests_all))
+        store = store_from_records(records,postings)
+        rescore_store(store,cluster_lookup)
+        option_dicts = build_option_dicts(options)
+    else:
+        store = build_store(*[pickle.loads(read_bytes(sources[name])) for name in REST_DICTS])
+        option_dicts = {name: pickle.loads(read_bytes(sources[name])) for name in OPTION_NAMES}
+    if 'rating_updates' in sources:
+        update_ratings(store,cluster_lookup,json.loads(read_bytes(sources['rating_updates'])))
+    top_k_index = build_top_k_index(store,**option_dicts,k=k)
+
+    bundle = store_files(store)
+    bundle.update(index_files(top_k_index))
+    bundle['clusters_dict.json'] = data_bytes('clusters',clusters_dict)
+    bundle['clusters_label_dict.json'] = data_bytes('cluster_labels',clusters_label_dict)
+    for name, option_dict in option_dicts.items():
+        bundle[name + '.json'] = data_bytes('options',option_dict)
+    for zoom_level, tier in GEOMETRY_TIERS.items():
+        bundle[tier_file(zoom_level)] = json.dumps(build_geometry_tier(gj,**tier),separators=(',',':')).encode('utf-8')
+    bundle[CLUSTER_MAP_FILE] = cluster_map_file([bundle[name] for name in CLUSTER_MAP_SOURCES])
+    return bundle
+
+#the landing page map for the contents of CLUSTER_MAP_SOURCES. folium gives the map elements random
+#ids, so the current map is kept when it was rendered from the same contents (otherwise every build
+#would change it):
+def cluster_map_file(contents,path=CLUSTER_MAP_FILE):
+    if os.path.exists(path):
+        data = read_bytes(path)
+        if data.startswith(cluster_map_stamp(contents).encode('utf-8')):
+            return data
+    return render_cluster_map_file(contents).encode('utf-8')
+
+def load_manifest(path=MANIFEST_FILE):
+    with open(path,'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError('{} has bundle format {}, expected {}'.format(path,manifest.get('format'),BUNDLE_FORMAT))
+    return manifest
+
+#write the bundle files whose content changed (under a temporary name, renamed at the end) and
+#the manifest. Returns the names of the files written:
+def write_bundle(bundle,sources=SOURCE_FILES,directory='.',manifest_path=MANIFEST_FILE):
+    written = []
+    artifacts = {}
+    for name, data in sorted(bundle.items()):
+        path = os.path.join(directory,name)
+        digest = content_hash(data)
+        artifacts[name] = {'sha256': digest, 'bytes': len(data)}
+        if os.path.exists(path) and content_hash(read_bytes(path)) == digest:
+            continue
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        write_bytes(path,data)
+        written.append(name)
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'sources': {name: {'path': path, 'sha256': content_hash(read_bytes(path))} for name, path in sorted(sources.items())},
+        'artifacts': artifacts
+    }
+    with atomic_write(os.path.join(directory,manifest_path),'w') as f:
+        json.dump(manifest,f,indent=1)
+    return written
+
+#files that do not match the manifest (changed sources mean the bundle should be rebuilt), or the
+#manifest itself if it is missing or unreadable:
+def check_bundle(directory='.',manifest_path=MANIFEST_FILE):
+    path = os.path.join(directory,manifest_path)
+    if not os.path.exists(path):
+        return ['{} is missing, build the bundle with python restaurantour_bundle.py'.format(manifest_path)]
+    try:
+        manifest = load_manifest(path)
+    except ValueError as e: #also JSONDecodeError
+        return ['{} can not be read ({})'.format(manifest_path,e)]
+    problems = []
+    for name, source in manifest['sources'].items():
+        if not os.path.exists(source['path']):
+            problems.append('source {} ({}) is missing'.format(name,source['path']))
+        elif content_hash(read_bytes(source['path'])) != source['sha256']:
+            problems.append('source {} ({}) changed since the bundle was built'.format(name,source['path']))
+    for name, path in bundle_sources().items():
+        if name not in manifest['sources']:
+            problems.append('source {} ({}) is not in the bundle yet'.format(name,path))
+    for name, artifact in manifest['artifacts'].items():
+        path = os.path.join(directory,name)
+        if not os.path.exists(path):
+            problems.append('{} is missing'.format(name))
+        elif content_hash(read_bytes(path)) != artifact['sha256']:
+            problems.append('{} does not match the manifest'.format(name))
+    return problems
+
+#compile the bundle from bundle_sources() and write it:
+def build_bundle():
+    sources = bundle_sources()
+    if 'df_rests_all' not in sources:
+        print(SOURCE_FILES['df_rests_all'], 'not found, compiling the shipped notebook outputs')
+    bundle = compile_bundle(sources)
+    written = write_bundle(bundle,sources)
+    print('built', len(bundle), 'files,', len(written), 'changed:', ', '.join(written) or 'none')
+    print('saved', MANIFEST_FILE)
+
+#python restaurantour_bundle.py [--check]
+if __name__ == '__main__':
+    if '--check' in sys.argv[1:]:
+        problems = check_bundle()
+        for problem in problems:
+            print(problem)
+        print('bundle ok' if not problems else '{} problems'.format(len(problems)))
+        sys.exit(1 if problems else 0)
+    build_bundle()
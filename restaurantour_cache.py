@@ -0,0 +1,95 @@
+#The Restaurantour - Result Cache
+
+#Bounded LRU cache with a time-to-live, shared by all sessions in the process (Streamlit runs
+#sessions as threads of one process). Used for the recommendation results, keyed by the
+#selection, so popular selections skip ranking and map rendering altogether.
+#A cache can also be bounded by the total size of its values (max_bytes, with sizeof giving the
+#size of a value), for values as large as the "show all matches" layers.
+
+import time
+import threading
+from collections import OrderedDict
+
+RECS_CACHE_SIZE = 512
+RECS_CACHE_TTL = 60 * 60 #seconds
+#the matches layers of all the selections together (a layer is up to about 3 MB):
+MATCHES_CACHE_SIZE = 64
+MATCHES_CACHE_BYTES = 32 * 2**20
+
+class ResultCache:
+    def __init__(self,max_size=RECS_CACHE_SIZE,ttl=RECS_CACHE_TTL,max_bytes=None,sizeof=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict() #key -> (expires, value, size), least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0 #dropped to stay under max_size and max_bytes
+        self.expirations = 0 #dropped after ttl
+
+    def get(self,key,default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self.drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self,key,value):
+        size = self.sizeof(value) if self.sizeof else 0
+        with self.lock:
+            if key in self.entries:
+                self.drop(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value, size)
+            self.total_bytes += size
+            while self.entries and (len(self.entries) > self.max_size or
+                                    (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+                self.drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    #remove an entry (the lock is held by the caller):
+    def drop(self,key):
+        self.total_bytes -= self.entries.pop(key)[2]
+
+    #cached value for key, computing (outside the lock) and storing it on a miss:
+    def get_or_compute(self,key,compute):
+        missing = object()
+        value = self.get(key,missing)
+        if value is missing:
+            value = compute()
+            self.put(key,value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+#recommendations (top restaurants and their markers) by selection and page:
+recs_cache = ResultCache()
+#"show all matches" layers by selection, bounded by their size in characters:
+matches_cache = ResultCache(max_size=MATCHES_CACHE_SIZE,max_bytes=MATCHES_CACHE_BYTES,sizeof=lambda layer: len(layer['script']))
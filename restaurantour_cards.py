@@ -0,0 +1,33 @@
+#The Restaurantour - Hover Cards
+
+#Popup HTML of each restaurant. The cards are formatted once when the store is built and kept
+#in the store by row id (see add_cards in restaurantour_store.py), so showing a recommendation
+#is a lookup. The store records the CARD_VERSION its cards were built with, and a store built
+#with another version is detected when it is loaded.
+
+import hashlib
+
+#bump when the card fields or their formatting change (editing HOVER_TEXT changes the version by itself):
+CARD_FORMAT = 1
+
+HOVER_TEXT = ('<b>{name}</b><br><br>'+
+              '<b>Neighborhood</b>: {neighborhood}<br>'+
+              '<b>Categories</b>: {categories}<br>'+
+              '<b>Price</b>: {price}<br>'+
+              '<b>Address</b>: {address}<br>'+
+              '<b>Phone</b>: {phone}<br>'+
+              '<b>Website</b>: <a href={website} target="_blank"> {website} </a><br>')
+
+CARD_VERSION = '{}-{}'.format(CARD_FORMAT,hashlib.sha1(HOVER_TEXT.encode('utf-8')).hexdigest()[:10])
+
+#card html for a restaurant record (as returned by restaurantour_store.get_records):
+def format_card(rest):
+    return HOVER_TEXT.format(
+        name=rest['name'],
+        neighborhood=', '.join([str(elem) for elem in rest['neighborhood']]),
+        categories=', '.join([str(elem) for elem in rest['categories']]),
+        price= rest['price'] if rest['price'] else 'not in database',
+        address= ', '.join([str(elem) for elem in rest['display_address']]),
+        phone=rest['display_phone'],
+        website= rest['website'] if rest['website'] else 'not in database'
+    )
@@ -0,0 +1,34 @@
+#The Restaurantour - Neighborhood Clusters
+
+#Inverted lookup from neighborhood name to its cluster label (clusters_label_dict) and cluster
+#number (clusters_dict['cluster']), built once when the data is loaded. Renamed neighborhoods
+#resolve under both their old and new names.
+
+#old name -> current name
+NEIGHBORHOOD_ALIASES = {
+    'East Whittier': 'East La Mirada'
+}
+
+def canonical_name(neigh):
+    return NEIGHBORHOOD_ALIASES.get(neigh,neigh)
+
+#neighborhood -> {'label': cluster label, 'cluster': cluster number}:
+def build_cluster_lookup(clusters_label_dict,clusters_dict):
+    cluster_lookup = {}
+    for label, neighs in clusters_label_dict.items():
+        for neigh in neighs:
+            cluster_lookup.setdefault(canonical_name(neigh),{})['label'] = label
+    for neigh, cluster in clusters_dict['cluster'].items():
+        cluster_lookup.setdefault(canonical_name(neigh),{})['cluster'] = cluster
+    for old_name, new_name in NEIGHBORHOOD_ALIASES.items():
+        if new_name in cluster_lookup:
+            cluster_lookup[old_name] = cluster_lookup[new_name]
+    return cluster_lookup
+
+#cluster label of a neighborhood, or None if it was not part of the clustering:
+def find_cluster_label(cluster_lookup,neigh):
+    return cluster_lookup.get(neigh,{}).get('label')
+
+#cluster number of a neighborhood, or None if it was not part of the clustering:
+def find_cluster(cluster_lookup,neigh):
+    return cluster_lookup.get(neigh,{}).get('cluster')
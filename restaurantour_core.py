@@ -0,0 +1,76 @@
+#The Restaurantour - Recommendation Core
+
+#Recommendation logic shared by the Streamlit app and the JSON API (restaurantour_api.py).
+#Works on the restaurant data from restaurantour_data.load_rest_data and only needs numpy:
+#no pandas, folium, branca or streamlit.
+
+from restaurantour_store import get_records
+from restaurantour_index import rank_ids
+from restaurantour_filter import match_ids
+
+TOP_N = 3
+
+#raise ValueError if the selection is empty or has a value that is not in the data:
+def check_selection(data,neigh_choice,cuisine_choice,price_choice):
+    store = data['rest_store']
+    if neigh_choice == '' and cuisine_choice == '' and price_choice == '':
+        raise ValueError('select a neighborhood, cuisine and/or price')
+    if neigh_choice != '' and neigh_choice not in store['neigh_postings']:
+        raise ValueError('unknown neighborhood: ' + neigh_choice)
+    if cuisine_choice != '' and cuisine_choice not in store['cuisine_postings']:
+        raise ValueError('unknown cuisine: ' + cuisine_choice)
+    if price_choice != '' and price_choice not in data['neigh_prices_dict']['All']:
+        raise ValueError('unknown price: ' + price_choice)
+
+#row ids of the top restaurants given a neighborhood, cuisine and/or price, skipping the first offset
+#(offset=3 gives the "next 3"):
+def find_top_ids(data,neigh_choice,cuisine_choice,price_choice,top_n=TOP_N,offset=0):
+    store = data['rest_store']
+    end = offset + top_n
+    #use the precomputed ranking when the selection is in the index (and it is long enough,
+    #a list of k ids may have been cut short):
+    top_k_index = data['top_k_index']
+    ids = top_k_index.get((neigh_choice,cuisine_choice,price_choice))
+    if ids is None or (end > len(ids) and len(ids) >= top_k_index.k):
+        #only the first end ids are ranked (partial selection, see rank_ids):
+        ids = rank_ids(store,match_ids(store,neigh_choice,cuisine_choice,price_choice),end)
+    return ids[offset:end]
+
+#popup html precompiled in the store (see restaurantour_cards.py):
+def add_hover_text(store,ids,top_rests):
+    for row, rest in zip(ids,top_rests):
+        rest['text'] = store['cards'][row]
+    return top_rests
+
+#all matching restaurants, best first, as one GeoJSON FeatureCollection (for the "show all matches" map).
+#The popups are the precompiled cards, rank 1 is the best match:
+def match_features(data,neigh_choice,cuisine_choice,price_choice):
+    check_selection(data,neigh_choice,cuisine_choice,price_choice)
+    store = data['rest_store']
+    ids = rank_ids(store,match_ids(store,neigh_choice,cuisine_choice,price_choice))
+    features = []
+    for rank, row in enumerate(ids):
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(float(store['long'][row]),5),round(float(store['lat'][row]),5)]},
+            'properties': {'name': store['name'][row], 'rank': rank + 1, 'card': store['cards'][row]}
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+#average location of the restaurants (NaN when there are none):
+def rests_center(top_rests):
+    if not top_rests:
+        return float('nan'), float('nan')
+    avg_lat = sum(rest['lat'] for rest in top_rests) / len(top_rests)
+    avg_long = sum(rest['long'] for rest in top_rests) / len(top_rests)
+    return avg_lat, avg_long
+
+def recommend(data,neigh_choice='',cuisine_choice='',price_choice='',top_n=TOP_N,offset=0,hover_text=False):
+    check_selection(data,neigh_choice,cuisine_choice,price_choice)
+    if top_n < 1 or offset < 0:
+        raise ValueError('top_n must be at least 1 and offset at least 0')
+    ids = find_top_ids(data,neigh_choice,cuisine_choice,price_choice,top_n,offset)
+    top_rests = get_records(data['rest_store'],ids)
+    if hover_text:
+        top_rests = add_hover_text(data['rest_store'],ids,top_rests)
+    return top_rests
@@ -0,0 +1,193 @@
+#The Restaurantour - App Data
+
+#Process-wide cache for everything the app loads at startup. Streamlit re-executes the app
+#script on every widget interaction, but imported modules persist, so the data is kept here.
+#The restaurant data (used by the app and the JSON API) and the map data are kept separately,
+#and the sidebar options are split out of them so the app can start without numpy/pandas/folium
+#(see restaurantour_startup.py for the import budget).
+#Entries are keyed on the (mtime, size) of their source files and rebuilt when a file changes
+#on disk; the files are only stat'ed once every CHECK_INTERVAL seconds.
+
+import os
+import json
+import time
+import hashlib
+import warnings
+import threading
+from restaurantour_geometry import load_geometry_tiers, add_cluster_labels, tier_file, GEOMETRY_TIERS
+from restaurantour_clusters import build_cluster_lookup, canonical_name
+from restaurantour_format import read_data, parse_data
+
+#seconds between checks of the data files for changes:
+CHECK_INTERVAL = 5
+
+#data files in the restaurantour format (restaurantour_format.py), built by restaurantour_bundle.py:
+STORE_FILE = 'rest_store.json'
+INDEX_FILE = 'rest_top_k.json'
+CLUSTERS_FILE = 'clusters_dict.json'
+CLUSTERS_LABEL_FILE = 'clusters_label_dict.json'
+OPTION_FILES = {
+    'neigh_cuisines_dict': 'neigh_cuisines_dict.json',
+    'neigh_prices_dict': 'neigh_prices_dict.json',
+    'cuisine_prices_dict': 'cuisine_prices_dict.json',
+    'neigh_cuisine_prices_dict': 'neigh_cuisine_prices_dict.json'
+}
+
+#landing page map, pre-rendered with the bundle (python restaurantour_bundle.py). Its first line is a
+#stamp with the hash of the files it was rendered from (the cluster files and the zoom 10 geometry):
+CLUSTER_MAP_FILE = 'cluster_map.html'
+CLUSTER_MAP_SOURCES = [CLUSTERS_FILE,CLUSTERS_LABEL_FILE,tier_file(10)]
+
+OPTION_DATA_FILES = [CLUSTERS_FILE,CLUSTERS_LABEL_FILE] + list(OPTION_FILES.values())
+#rest_store.json and rest_top_k.json hold the hashes of their column files, so they also change
+#when only a column does:
+REST_DATA_FILES = OPTION_DATA_FILES + [STORE_FILE,INDEX_FILE]
+MAP_DATA_FILES = OPTION_DATA_FILES + [tier_file(zoom_level) for zoom_level in GEOMETRY_TIERS]
+
+#name -> {'stamp', 'checked', 'value'}
+resource_cache = {}
+#reentrant: building one resource can load another (rest_data -> option_data)
+cache_lock = threading.RLock()
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+#return the cached value for name, rebuilding it if any of its files changed on disk:
+def cached_resource(name,paths,build):
+    entry = resource_cache.get(name)
+    if entry is not None and time.monotonic() - entry['checked'] < CHECK_INTERVAL:
+        return entry['value']
+    with cache_lock:
+        entry = resource_cache.get(name)
+        stamp = tuple(file_stamp(path) for path in paths)
+        if entry is None or entry['stamp'] != stamp:
+            entry = {'stamp': stamp, 'value': build()}
+            resource_cache[name] = entry
+        entry['checked'] = time.monotonic()
+        return entry['value']
+
+#clusters_dict as a df sorted by neighborhood name (used for the choropleth):
+def build_df_clusters(clusters_dict):
+    import pandas as pd #only needed for the maps, keeps the API free of pandas
+    df_clusters = pd.DataFrame(clusters_dict)
+    df_clusters.loc[:,'name'] = df_clusters.index
+    #sort by name:
+    df_clusters = df_clusters.sort_values(by = 'name')
+    df_clusters = df_clusters.reset_index().drop('index',axis=1)
+    return df_clusters
+
+#rename East Whittier to East La Mirada (see NEIGHBORHOOD_ALIASES):
+def canonical_clusters(clusters_dict):
+    return {'cluster': {canonical_name(neigh): cluster for neigh, cluster in clusters_dict['cluster'].items()}}
+
+#clusters and sidebar options (plain dicts, no numpy needed):
+def build_option_data():
+    data = {}
+    #clusters_dict contains results from clustering analysis:
+    clusters_dict = canonical_clusters(read_data(CLUSTERS_FILE,'clusters'))
+    data['clusters_dict'] = clusters_dict
+
+    #clusters_label_dict contains the assigned label from the clustering analysis:
+    data['clusters_label_dict'] = read_data(CLUSTERS_LABEL_FILE,'cluster_labels')
+    #neighborhood -> cluster label and number:
+    data['cluster_lookup'] = build_cluster_lookup(data['clusters_label_dict'],clusters_dict)
+
+    #option dicts for the sidebar (cuisines and prices by neighborhood/cuisine):
+    for name, path in OPTION_FILES.items():
+        data[name] = read_data(path,'options')
+
+    #changes whenever the data is rebuilt, used to key caches derived from it:
+    data['version'] = str(time.time_ns())
+    return data
+
+#restaurants and rankings on top of the options (everything the recommendations need):
+def build_rest_data():
+    #numpy is only imported once the restaurant data is needed:
+    from restaurantour_store import load_store
+    from restaurantour_index import load_index
+    option_data = load_option_data()
+    data = dict(option_data)
+    #rest_store holds each restaurant once, with posting lists (row ids) by neighborhood, cuisine and price:
+    data['rest_store'] = load_store(STORE_FILE)
+    #top_k_index has the ranked restaurant ids for every selection the sidebar can produce:
+    data['top_k_index'] = load_index(INDEX_FILE)
+    data['version'] = option_data['version'] + '_' + str(time.time_ns())
+    return data
+
+#choropleth inputs for the maps:
+def build_map_data():
+    option_data = load_option_data()
+    data = {}
+    data['df_clusters'] = build_df_clusters(option_data['clusters_dict'])
+    #geojson info for la neighborhoods, simplified for each map zoom level:
+    data['gj_tiers'] = load_geometry_tiers()
+    #geojson info including cluster labels (same polygons as the zoom 10 tier):
+    data['gj_clusters'] = add_cluster_labels(data['gj_tiers'][10],option_data['cluster_lookup'])
+    data['version'] = option_data['version'] + '_' + str(time.time_ns())
+    return data
+
+def load_option_data():
+    return cached_resource('option_data',OPTION_DATA_FILES,build_option_data)
+
+def load_rest_data():
+    return cached_resource('rest_data',REST_DATA_FILES,build_rest_data)
+
+def load_map_data():
+    return cached_resource('map_data',MAP_DATA_FILES,build_map_data)
+
+#restaurant and map data together, for the Streamlit app:
+def load_app_data():
+    rest_data = load_rest_data()
+    map_data = load_map_data()
+    data = dict(rest_data)
+    data.update(map_data)
+    data['version'] = rest_data['version'] + '_' + map_data['version']
+    return data
+
+def read_bytes(path):
+    with open(path,'rb') as f:
+        return f.read()
+
+#first line of the pre-rendered landing page map, given the contents of CLUSTER_MAP_SOURCES:
+def cluster_map_stamp(contents):
+    digest = hashlib.sha256()
+    for data in contents:
+        digest.update(hashlib.sha256(data).digest())
+    return '<!-- restaurantour map data {} -->\n'.format(digest.hexdigest())
+
+#the pre-rendered map without its stamp, or None if it is missing or was rendered from other data:
+def read_cluster_map_html():
+    if not os.path.exists(CLUSTER_MAP_FILE):
+        return None
+    html = read_bytes(CLUSTER_MAP_FILE).decode('utf-8')
+    stamp = cluster_map_stamp([read_bytes(path) for path in CLUSTER_MAP_SOURCES])
+    if not html.startswith(stamp):
+        warnings.warn('{} was rendered from other map data, rendering the landing page map again '
+                      '(pre-render it with python restaurantour_bundle.py)'.format(CLUSTER_MAP_FILE))
+        return None
+    return html[len(stamp):]
+
+def build_cluster_map_html():
+    html = read_cluster_map_html()
+    if html is not None: #no folium needed
+        return html
+    from restaurantour_maps import get_cluster_map_html
+    map_data = load_map_data()
+    return get_cluster_map_html(map_data['gj_tiers'][10],map_data['gj_clusters'],map_data['df_clusters'],map_data['version'])
+
+#contents of CLUSTER_MAP_FILE for the contents of CLUSTER_MAP_SOURCES (stamp and html), rendered
+#by restaurantour_bundle.py from the files it builds:
+def render_cluster_map_file(contents):
+    from restaurantour_maps import create_cluster_map, render_map
+    clusters_dict = canonical_clusters(parse_data(contents[0],'clusters'))
+    clusters_label_dict = parse_data(contents[1],'cluster_labels')
+    gj = json.loads(contents[2])
+    gj_clusters = add_cluster_labels(gj,build_cluster_lookup(clusters_label_dict,clusters_dict))
+    html = render_map(create_cluster_map(gj,gj_clusters,build_df_clusters(clusters_dict)))
+    return cluster_map_stamp(contents) + html
+
+#landing page map html, checked again whenever the map file or the data it was rendered from changes:
+def load_cluster_map_html():
+    paths = CLUSTER_MAP_SOURCES + [path for path in [CLUSTER_MAP_FILE] if os.path.exists(path)]
+    return cached_resource('cluster_map',paths,build_cluster_map_html)
@@ -0,0 +1,29 @@
+#The Restaurantour - File Writes
+
+#Every file the app modules write (the bundle files, its manifest and the rating updates) goes
+#through atomic_write: the content is written to a temporary file next to the target, which is
+#renamed over it only when the write completed. An interrupted write never leaves a partial file,
+#and processes that have the old file open (or memory-mapped) keep reading the old file. The
+#temporary name includes the process and thread, so concurrent writers of the same path do not
+#write into each other's file. The wrangling scripts have the same helper in
+#data-wrangling/restaurantour_stream.py.
+
+import os
+import threading
+from contextlib import contextmanager
+
+#file object for writing path ('w' or 'wb'), renamed to path when the block ends without an error:
+@contextmanager
+def atomic_write(path,mode='wb'):
+    tmp_path = '{}.{}.{}.tmp'.format(path,os.getpid(),threading.get_ident())
+    try:
+        with open(tmp_path,mode) as f:
+            yield f
+        os.replace(tmp_path,path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_bytes(path,data):
+    with atomic_write(path) as f:
+        f.write(data)
@@ -0,0 +1,36 @@
+#The Restaurantour - Restaurant Filters
+
+#Vectorized filters over the restaurant store. The cuisine posting lists are the columns of
+#the restaurant x cuisine sparse membership matrix, so a cuisine filter is a boolean mask
+#gathered at the candidate row ids, and a price filter compares their price codes.
+#A neighborhood + cuisine + price query applies both filters to the neighborhood's id array.
+
+import numpy as np
+from restaurantour_store import num_rests, price_to_code
+
+#boolean mask over all restaurants that list the cuisine in their categories:
+def cuisine_mask(store,cuisine_choice):
+    mask = np.zeros(num_rests(store),dtype=bool)
+    mask[store['cuisine_postings'].get(cuisine_choice,[])] = True
+    return mask
+
+def find_by_cuisine(store,cuisine_choice,ids):
+    return ids[cuisine_mask(store,cuisine_choice)[ids]]
+
+def find_by_price(store,price_choice,ids):
+    return ids[store['price_code'][ids] == price_to_code(price_choice)]
+
+#restaurant ids matching a selection (same filters the app always used, posting order preserved):
+def match_ids(store,neigh_choice,cuisine_choice,price_choice):
+    if neigh_choice != '':
+        ids = store['neigh_postings'][neigh_choice]
+    elif cuisine_choice != '':
+        ids = store['cuisine_postings'][cuisine_choice]
+        cuisine_choice = '' #already filtered
+    else:
+        return store['price_postings'][price_choice]
+    if cuisine_choice != '':
+        ids = find_by_cuisine(store,cuisine_choice,ids)
+    if price_choice != '':
+        ids = find_by_price(store,price_choice,ids)
+    return ids
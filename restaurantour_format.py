@@ -0,0 +1,146 @@
+#The Restaurantour - Data Format
+
+#The app data files are JSON documents instead of pickles, so they do not depend on the Python,
+#pandas or numpy version that wrote them and nothing in them is executed on load:
+#   {"format": "restaurantour", "kind": "options", "version": 1, "data": ...}
+#Each kind of document has a version and a schema (DATA_KINDS). read_data checks both before
+#returning and raises DataFormatError naming the file, so a stale or hand-edited file fails at
+#load time instead of somewhere in the app. The numeric arrays of the store and the top k index
+#are .npy files next to them (loaded with allow_pickle=False), which are also version independent.
+#
+#Schemas are built from: a type (str, int, float, bool, None), a tuple of types (any of them),
+#[schema] (a list of those), {str: schema} (a dict with any keys) or {'field': schema, ...} (a
+#dict with exactly these fields).
+#When a kind changes, bump its version: files written with another version are refused and have
+#to be rebuilt (python restaurantour_bundle.py).
+
+import json
+from itertools import chain
+from collections import defaultdict
+
+FORMAT_NAME = 'restaurantour'
+
+DATA_KINDS = {
+    #clusters_dict.json: {'cluster': {neighborhood: cluster}}
+    'clusters': {'version': 1, 'schema': {'cluster': {str: int}}},
+    #clusters_label_dict.json: {label: [neighborhoods]}
+    'cluster_labels': {'version': 1, 'schema': {str: [str]}},
+    #the sidebar option dicts: {'All': [values], key: [values]}
+    'options': {'version': 1, 'schema': {str: [str]}},
+    #rest_store.json, the tables of the restaurant store (the columns are in rest_columns/)
+    'store': {'version': 1, 'schema': {
+        'neighborhoods': [str],
+        'categories': [str],
+        'display_address': [[str]],
+        'website': [(str,None)],
+        'card_version': str,
+        'posting_keys': {str: [str]},
+        'column_hashes': {str: str}
+    }},
+    #rest_top_k.json, the key tables of the top k index (the ranked ids are in rest_columns/)
+    'top_k_index': {'version': 2, 'schema': {
+        'neighborhoods': [str],
+        'cuisines': [str],
+        'prices': [str],
+        'k': int,
+        'column_hashes': {str: str}
+    }}
+}
+
+class DataFormatError(ValueError):
+    pass
+
+#set of the exact types a schema allows (so bool is not an int, lists and dicts can be subclasses),
+#None if the schema is a list or a dict:
+def simple_types(schema):
+    if schema is None:
+        return {type(None)}
+    if isinstance(schema,type):
+        return {schema}
+    if isinstance(schema,tuple):
+        types = [simple_types(option) for option in schema]
+        if None not in types:
+            return set().union(*types)
+    return None
+
+def type_names(types):
+    return ' or '.join(sorted('null' if t is type(None) else t.__name__ for t in types))
+
+#quick check of many values at once when they are simple values or lists of them (False means
+#they have to be checked one by one):
+def all_match(values,schema):
+    types = simple_types(schema)
+    if types is not None:
+        return set(map(type,values)) <= types
+    if isinstance(schema,list) and simple_types(schema[0]) is not None:
+        values = list(values)
+        return set(map(type,values)) <= {list} and set(map(type,chain.from_iterable(values))) <= simple_types(schema[0])
+    return False
+
+#None, or the path to the first value that does not match and what is wrong with it (the path is
+#only built for the error):
+def schema_error(value,schema):
+    types = simple_types(schema)
+    if types is not None:
+        if type(value) in types:
+            return None
+        return [], 'should be {}, not {}'.format(type_names(types),type(value).__name__)
+    if isinstance(schema,list):
+        if not isinstance(value,list):
+            return [], 'should be a list, not {}'.format(type(value).__name__)
+        if all_match(value,schema[0]):
+            return None
+        items = enumerate(value)
+    else:
+        if not isinstance(value,dict):
+            return [], 'should be a dict, not {}'.format(type(value).__name__)
+        if str in schema: #any keys
+            if all_match(value.values(),schema[str]):
+                return None
+            items = value.items()
+        else:
+            if set(value) != set(schema):
+                return [], 'should have the fields {}, not {}'.format(sorted(schema),sorted(value))
+            items = ((field, value[field]) for field in schema)
+    for key, item in items:
+        item_schema = schema[0] if isinstance(schema,list) else schema[str] if str in schema else schema[key]
+        error = schema_error(item,item_schema)
+        if error:
+            error[0].insert(0,key)
+            return error
+    return None
+
+#raises DataFormatError naming the value that does not match the schema of kind:
+def check_data(kind,data,where='data'):
+    error = schema_error(data,DATA_KINDS[kind]['schema'])
+    if error:
+        path, problem = error
+        raise DataFormatError('{}{} {}'.format(where,''.join('[{!r}]'.format(key) for key in path),problem))
+
+def data_bytes(kind,data):
+    check_data(kind,data)
+    document = {'format': FORMAT_NAME, 'kind': kind, 'version': DATA_KINDS[kind]['version'], 'data': data}
+    return json.dumps(document,ensure_ascii=False,separators=(',',':')).encode('utf-8')
+
+#the data of a kind document, the option dicts as defaultdict(list) (missing keys have no options):
+def read_data(path,kind):
+    with open(path,'rb') as f:
+        return parse_data(f.read(),kind,path)
+
+#same for the bytes of a document (path names it in the errors):
+def parse_data(data,kind,path='data'):
+    try:
+        document = json.loads(data.decode('utf-8'))
+    except ValueError as e: #also UnicodeDecodeError and JSONDecodeError
+        raise DataFormatError('{} is not a {} data file ({})'.format(path,FORMAT_NAME,e))
+    if not isinstance(document,dict) or document.get('format') != FORMAT_NAME:
+        raise DataFormatError('{} is not a {} data file'.format(path,FORMAT_NAME))
+    if document.get('kind') != kind:
+        raise DataFormatError('{} holds {} data, expected {}'.format(path,document.get('kind'),kind))
+    if document.get('version') != DATA_KINDS[kind]['version']:
+        raise DataFormatError('{} has {} version {}, expected {}: rebuild it with python restaurantour_bundle.py'
+                              .format(path,kind,document.get('version'),DATA_KINDS[kind]['version']))
+    check_data(kind,document.get('data'),path)
+    if kind == 'options':
+        return defaultdict(list,document['data'])
+    return document['data']
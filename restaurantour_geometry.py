@@ -0,0 +1,79 @@
+#The Restaurantour - Neighborhood Geometry
+
+#Build-time pipeline for the neighborhood polygons shipped to the browser. The full-resolution
+#geojson (data-wrangling/datasets/la_neighborhoods_gj.json) is simplified with Douglas-Peucker
+#and the coordinates are quantized, giving one file per map zoom level (built by
+#restaurantour_bundle.py). Only the 'name' property is kept. The cluster geojson is no longer
+#shipped separately: it is the same polygons plus a 'cluster' property, which is added at load
+#time from the cluster lookup.
+
+import json
+from restaurantour_clusters import find_cluster_label
+
+#tolerance in degrees (about one pixel or less at that zoom) and decimals kept:
+GEOMETRY_TIERS = {
+    10: {'tolerance': 0.0008, 'precision': 4},
+    13: {'tolerance': 0.0001, 'precision': 5}
+}
+
+KEEP_PROPERTIES = ['name']
+
+def tier_file(zoom_level):
+    return 'la_neighborhoods_gj_z{}.json'.format(zoom_level)
+
+#round a ring's coordinates, dropping points that collapse onto the previous one:
+def quantize_ring(ring,precision):
+    points = []
+    for x, y in ring:
+        point = [round(x,precision),round(y,precision)]
+        if not points or point != points[-1]:
+            points.append(point)
+    return points
+
+def quantize_polygon(polygon,precision):
+    rings = []
+    for ring in polygon:
+        ring = quantize_ring(ring,precision)
+        if len(ring) >= 4: #a closed ring needs at least 4 points
+            rings.append(ring)
+        elif not rings: #the exterior collapsed, drop the polygon
+            return []
+    return rings
+
+def simplify_geometry(geometry,tolerance,precision):
+    from shapely.geometry import shape, mapping #only needed at build time
+    simplified = mapping(shape(geometry).simplify(tolerance,preserve_topology=True))
+    if simplified['type'] == 'Polygon':
+        polygons = [simplified['coordinates']]
+    else:
+        polygons = simplified['coordinates']
+    polygons = [p for p in (quantize_polygon(p,precision) for p in polygons) if p]
+    if not polygons: #too small for this tier, keep the original shape
+        return geometry
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+def build_geometry_tier(gj,tolerance,precision):
+    features = []
+    for feature in gj['features']:
+        features.append({
+            'type': 'Feature',
+            'properties': {key: feature['properties'][key] for key in KEEP_PROPERTIES},
+            'geometry': simplify_geometry(feature['geometry'],tolerance,precision)
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+def load_geometry_tiers():
+    gj_tiers = {}
+    for zoom_level in GEOMETRY_TIERS:
+        with open(tier_file(zoom_level),'r') as f:
+            gj_tiers[zoom_level] = json.load(f)
+    return gj_tiers
+
+#same polygons with the cluster label of each neighborhood ('none' when it has no label):
+def add_cluster_labels(gj,cluster_lookup):
+    features = []
+    for feature in gj['features']:
+        properties = dict(feature['properties'])
+        properties['cluster'] = find_cluster_label(cluster_lookup,properties['name']) or 'none'
+        features.append({'type': 'Feature', 'properties': properties, 'geometry': feature['geometry']})
+    return {'type': 'FeatureCollection', 'features': features}
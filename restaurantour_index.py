@@ -0,0 +1,152 @@
+#The Restaurantour - Top K Index
+
+#Offline build step that ranks the restaurants for every valid (neighborhood, cuisine, price)
+#selection listed in the option dicts, including the single- and two-facet selections.
+#The app answers a selection with an index lookup instead of filtering and sorting.
+#Keys are (neigh_choice, cuisine_choice, price_choice) with '' for facets that are not used.
+#Each selection keeps its best k restaurants (TOP_K unless built with another k, which is saved
+#with the index): a shorter list has every match of the selection.
+#On disk the ranked ids of all the selections are one array in rest_columns/ (with the offsets of
+#each selection and its key as codes into the name tables of rest_top_k.json), memory-mapped by
+#load_index like the store columns.
+
+import os
+import hashlib
+import numpy as np
+from restaurantour_store import npy_bytes, column_file, load_column, COLUMNS_DIR
+from restaurantour_filter import match_ids
+from restaurantour_format import data_bytes, read_data, DataFormatError
+
+TOP_K = 10
+
+INDEX_FILE = 'rest_top_k.json'
+
+INDEX_DTYPES = {'top_k_keys': np.int32, 'top_k_offsets': np.int64, 'top_k_ids': np.int32}
+OPTION_NAMES = ['neigh_cuisines_dict','neigh_prices_dict','cuisine_prices_dict','neigh_cuisine_prices_dict']
+
+#sort by bayes_yelp_rating then yelp_review_count (both descending); lexsort is stable so
+#ties keep the posting list order, same as the pandas sort_values used by the app.
+#With a limit only the first limit ids are returned, without sorting the whole list: the
+#limit-th best rating is found with a partial selection, and only the ids rated at least
+#that high (in posting list order, so ties still rank the same) are sorted:
+def rank_ids(store,ids,limit=None):
+    ratings = store['bayes_yelp_rating'][ids]
+    if limit is not None and limit < len(ids):
+        if limit <= 0:
+            return ids[:0]
+        threshold = -np.partition(-ratings,limit - 1)[limit - 1]
+        keep = ratings >= threshold
+        ids, ratings = ids[keep], ratings[keep]
+    order = np.lexsort((-store['yelp_review_count'][ids],-ratings))
+    return ids[order][:limit]
+
+#all selections the sidebar can produce:
+def selection_keys(neigh_cuisines_dict,neigh_prices_dict,cuisine_prices_dict,neigh_cuisine_prices_dict):
+    keys = []
+    for neigh in neigh_cuisines_dict:
+        if neigh == 'All':
+            continue
+        keys.append((neigh,'',''))
+        for cuisine in neigh_cuisines_dict[neigh]:
+            keys.append((neigh,cuisine,''))
+            for price in neigh_cuisine_prices_dict.get(neigh + '_' + cuisine,[]):
+                keys.append((neigh,cuisine,price))
+        for price in neigh_prices_dict.get(neigh,[]):
+            keys.append((neigh,'',price))
+    for cuisine in neigh_cuisines_dict['All']:
+        keys.append(('',cuisine,''))
+        for price in cuisine_prices_dict.get(cuisine,[]):
+            keys.append(('',cuisine,price))
+    for price in neigh_prices_dict['All']:
+        keys.append(('','',price))
+    return keys
+
+#names of each facet, the facet codes of each key and the ranked ids of all keys in one array:
+def index_arrays(keys,ranked):
+    facets = [[],[],[]]
+    lookups = [{},{},{}]
+    codes = []
+    for key in keys:
+        for facet, value in enumerate(key):
+            if value not in lookups[facet]:
+                lookups[facet][value] = len(facets[facet])
+                facets[facet].append(value)
+            codes.append(lookups[facet][value])
+    codes = np.array(codes,dtype=np.int32).reshape(-1,3)
+    offsets = np.cumsum([0] + [len(ids) for ids in ranked]).astype(np.int64)
+    ids = np.concatenate(ranked).astype(np.int32) if ranked else np.zeros(0,dtype=np.int32)
+    return facets, codes, ids, offsets
+
+def build_top_k_index(store,neigh_cuisines_dict,neigh_prices_dict,cuisine_prices_dict,neigh_cuisine_prices_dict,k=TOP_K):
+    keys = selection_keys(neigh_cuisines_dict,neigh_prices_dict,cuisine_prices_dict,neigh_cuisine_prices_dict)
+    ranked = [rank_ids(store,match_ids(store,*key),k) for key in keys]
+    return TopKIndex(*index_arrays(keys,ranked),k)
+
+#ranked row ids by selection, get() returns a tuple like a dict of tuples. A key is looked up by
+#its facet codes, combined into one number and found in the sorted numbers of all the keys:
+class TopKIndex:
+    def __init__(self,facets,codes,ids,offsets,k):
+        self.facets = facets
+        self.codes = codes
+        self.ids = ids
+        self.offsets = offsets
+        self.k = k #lists of k ids may be cut short, shorter ones have every match
+        self.facet_lookups = [{value: code for code, value in enumerate(values)} for values in facets]
+        self.sizes = [len(values) for values in facets]
+        combined = self.combine(codes[:,0].astype(np.int64),codes[:,1],codes[:,2])
+        self.order = np.argsort(combined)
+        self.sorted_keys = combined[self.order]
+
+    def combine(self,neigh,cuisine,price):
+        return (neigh * self.sizes[1] + cuisine) * self.sizes[2] + price
+
+    def position(self,key):
+        codes = [lookup.get(value) for lookup, value in zip(self.facet_lookups,key)]
+        if len(codes) != 3 or None in codes:
+            return None
+        combined = self.combine(*codes)
+        i = np.searchsorted(self.sorted_keys,combined)
+        if i == len(self.sorted_keys) or self.sorted_keys[i] != combined:
+            return None
+        return self.order[i]
+
+    def get(self,key,default=None):
+        i = self.position(key)
+        if i is None:
+            return default
+        return tuple(self.ids[self.offsets[i]:self.offsets[i + 1]].tolist())
+
+    def __contains__(self,key):
+        return self.position(key) is not None
+
+    def __len__(self):
+        return len(self.sorted_keys)
+
+#contents of the index files ({path relative to the directory of INDEX_FILE: bytes}), the json
+#tables last:
+def index_files(top_k_index,path=INDEX_FILE):
+    files = {
+        column_file('top_k_keys'): npy_bytes(top_k_index.codes),
+        column_file('top_k_offsets'): npy_bytes(top_k_index.offsets),
+        column_file('top_k_ids'): npy_bytes(top_k_index.ids)
+    }
+    tables = {
+        'neighborhoods': top_k_index.facets[0],
+        'cuisines': top_k_index.facets[1],
+        'prices': top_k_index.facets[2],
+        'k': top_k_index.k,
+        'column_hashes': {name: hashlib.sha256(data).hexdigest() for name, data in files.items()}
+    }
+    files[os.path.basename(path)] = data_bytes('top_k_index',tables)
+    return files
+
+#raises DataFormatError if the files do not match the index format:
+def load_index(path=INDEX_FILE,mmap=True):
+    tables = read_data(path,'top_k_index')
+    directory = os.path.dirname(path)
+    codes, offsets, ids = [load_column(directory,name,dtype,mmap) for name, dtype in INDEX_DTYPES.items()]
+    facets = [tables['neighborhoods'],tables['cuisines'],tables['prices']]
+    if (codes.ndim != 2 or codes.shape[1] != 3 or len(offsets) != len(codes) + 1 or offsets[-1] != len(ids)
+            or any(len(codes) and codes[:,facet].max() >= len(facets[facet]) for facet in range(3))):
+        raise DataFormatError('the top k files in {} do not match {}'.format(os.path.join(directory,COLUMNS_DIR),path))
+    return TopKIndex(facets,codes,ids,offsets,tables['k'])
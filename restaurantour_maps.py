@@ -0,0 +1,182 @@
+#The Restaurantour - Maps
+
+#The choropleth base layers are rendered to HTML once per process and cached here (this module
+#is imported, so it is not re-executed on Streamlit reruns). Each recommendation only fills in
+#the map center and appends a small script with its markers, instead of rebuilding and
+#re-serializing the whole folium map. folium is imported on first render, so importing this
+#module is cheap; the landing page map is pre-rendered to CLUSTER_MAP_FILE when run as a script.
+
+import base64
+import json
+import streamlit.components.v1 as components
+
+LA_CENTER = [34.04386826477363,-118.25840454347254]
+
+#placeholder center in the cached base map html, replaced per request:
+CENTER_PLACEHOLDER = [-89.98765, 179.98765]
+
+MAP_WIDTH = 700
+MAP_HEIGHT = 500
+
+MARKER_ICON = {'extraClasses': 'fa-rotate-0', 'icon': 'glyphicon-cutlery', 'iconColor': 'white',
+               'markerColor': 'lightblue', 'prefix': 'glyphicon'}
+
+MARKER_JS = '''
+        (function() {{
+            var marker = L.marker([{lat}, {long}], {{}}).addTo({map_name});
+            marker.setIcon(L.AwesomeMarkers.icon({icon}));
+            var popup = L.popup({{"maxWidth": 2650}});
+            popup.setContent($(`<iframe src="data:text/html;charset=utf-8;base64,{text}" width="430" style="border:none !important;" height="180"></iframe>`)[0]);
+            marker.bindPopup(popup);
+        }})();
+'''
+
+#all matches as a single geojson layer of circle markers drawn on one canvas, with each popup
+#created from the feature's card only when it is opened:
+MATCHES_JS = '''
+        (function() {{
+            var matches = {matches};
+            var renderer = L.canvas();
+            L.geoJson(matches, {{
+                pointToLayer: function(feature, latlng) {{
+                    return L.circleMarker(latlng, {{"renderer": renderer, "radius": 5, "color": "#08519c",
+                                                    "weight": 1, "fillColor": "#6baed6", "fillOpacity": 0.8}});
+                }},
+                onEachFeature: function(feature, layer) {{
+                    layer.bindPopup(function() {{
+                        return '<div style="width: 430px;">' + feature.properties.card + '</div>';
+                    }}, {{"maxWidth": 450}});
+                }}
+            }}).addTo({map_name});
+        }})();
+'''
+
+#process-wide cache of rendered base maps, for the current data version only:
+base_map_cache = {}
+
+def cache_get(key,version,render):
+    if base_map_cache.get('version') != version: #data was reloaded
+        base_map_cache.clear()
+        base_map_cache['version'] = version
+    if key not in base_map_cache:
+        base_map_cache[key] = render()
+    return base_map_cache[key]
+
+def choropleth(gj,df_clusters,**kwargs):
+    import folium
+    return folium.Choropleth(
+        geo_data=gj,
+        name="choropleth",
+        data=df_clusters,
+        columns=["name", "cluster"],
+        key_on="properties.name",
+        fill_color="RdYlBu",
+        fill_opacity=0.7,
+        line_opacity=0.2,
+        bins = len(df_clusters['cluster'].unique()),
+        **kwargs
+    )
+
+def create_base_map(gj,df_clusters,zoom_level):
+    import folium
+    m = folium.Map(location=CENTER_PLACEHOLDER,zoom_start=zoom_level)
+    folium.TileLayer('cartodbpositron').add_to(m)
+    c = choropleth(gj,df_clusters)
+    #remove the legend
+    for key in list(c._children):
+        if key.startswith('color_map'):
+            del(c._children[key])
+    c.add_to(m)
+    return m
+
+def create_cluster_map(gj,gj_clusters,df_clusters):
+    import folium
+    cluster_map = folium.Map(
+        location=LA_CENTER,
+        tiles='cartodbpositron',
+        zoom_start=10,
+        control_scale=True
+        )
+    folium.TileLayer('cartodbpositron').add_to(cluster_map)
+    choropleth(gj,df_clusters,legend_name="Neighborhood Type").add_to(cluster_map)
+    folium.GeoJson(
+        gj_clusters,
+        name='Clusters',
+        show=True,
+        highlight_function=lambda x: {
+            'fillOpacity':1
+        },
+        tooltip=folium.features.GeoJsonTooltip(
+            fields=['name','cluster'],
+            aliases=['Neighborhood','Type'],
+        ),
+    ).add_to(cluster_map)
+    return cluster_map
+
+def render_map(m):
+    import folium
+    return folium.Figure().add_child(m).render()
+
+#base map html and the name of its leaflet map variable, rendered once per zoom level:
+def get_base_map(gj,df_clusters,zoom_level,version=''):
+    def render():
+        m = create_base_map(gj,df_clusters,zoom_level)
+        return render_map(m), m.get_name()
+    return cache_get(('base',zoom_level),version,render)
+
+def get_cluster_map_html(gj,gj_clusters,df_clusters,version=''):
+    return cache_get(('clusters',),version,lambda: render_map(create_cluster_map(gj,gj_clusters,df_clusters)))
+
+def marker_script(map_name,top_3):
+    scripts = []
+    for row in top_3:
+        #same iframe content that folium.Html + branca IFrame produce:
+        text = '<div style="width: 100.0%; height: 100.0%;">' + row['text'] + '</div>'
+        scripts.append(MARKER_JS.format(
+            lat=json.dumps(float(row['lat'])),
+            long=json.dumps(float(row['long'])),
+            map_name=map_name,
+            icon=json.dumps(MARKER_ICON),
+            text=base64.b64encode(text.encode('utf-8')).decode('utf-8')
+        ))
+    return '<script>' + ''.join(scripts) + '</script>\n'
+
+#center and marker script for one recommendation (small, so it can be cached per selection):
+def recs_overlay(gj,df_clusters,zoom_level,avg_lat,avg_long,top_3,version=''):
+    html, map_name = get_base_map(gj,df_clusters,zoom_level,version)
+    if len(top_3) == 0: #no matches, center on LA
+        avg_lat, avg_long = LA_CENTER
+    return {'center': [avg_lat, avg_long], 'script': marker_script(map_name,top_3)}
+
+def matches_script(map_name,matches):
+    #escape '</' so a card cannot close the script tag:
+    data = json.dumps(matches,separators=(',',':')).replace('</','<\\/')
+    return '<script>' + MATCHES_JS.format(matches=data,map_name=map_name) + '</script>\n'
+
+#center and script of the "show all matches" layer, every match as a circle. The layer does not
+#depend on the page shown, so it is cached once per selection (it can be a few MB):
+def matches_layer(gj,df_clusters,zoom_level,matches,version=''):
+    html, map_name = get_base_map(gj,df_clusters,zoom_level,version)
+    features = matches['features']
+    if len(features) == 0: #no matches, center on LA
+        center = LA_CENTER
+    else:
+        center = [sum(f['geometry']['coordinates'][1] for f in features) / len(features),
+                  sum(f['geometry']['coordinates'][0] for f in features) / len(features)]
+    return {'center': center, 'script': matches_script(map_name,matches)}
+
+#the "show all matches" map: the matches layer with a page's top markers (from recs_overlay) on top:
+def matches_overlay(layer,overlay):
+    return {'center': layer['center'], 'script': layer['script'] + overlay['script']}
+
+#fill the cached base map with a recommendation's center and markers:
+def render_recs_map(gj,df_clusters,zoom_level,overlay,version=''):
+    html, map_name = get_base_map(gj,df_clusters,zoom_level,version)
+    center = 'center: [{}, {}]'.format(*overlay['center'])
+    html = html.replace('center: {}'.format(CENTER_PLACEHOLDER),center,1)
+    end = html.rindex('</html>')
+    return html[:end] + overlay['script'] + html[end:]
+
+#same component call as streamlit_folium.folium_static:
+def show_map(html):
+    return components.html(html,height=MAP_HEIGHT + 10,width=MAP_WIDTH)
@@ -0,0 +1,132 @@
+#The Restaurantour - Bayesian Ratings
+
+#Bayesian average of the Yelp ratings (bayes_yelp_rating, which the ranking sorts by), computed
+#with numpy for all the restaurants of the store at once. Each rating is pulled towards a prior
+#mean mu with the weight of N reviews:
+#    bayes_yelp_rating = (expected review rating * review count + mu * N) / (review count + N)
+#The ratings adjustment notebook averaged simulated reviews (normal around the Yelp rating with
+#a spread of 0.5, clipped to 0-5); the expected value of such a review is used instead, so the
+#result is the same on average but does not change from run to run.
+#
+#The priors (PRIORS) are the ones from the notebook: mu is 2 for '$' and '$$$$' restaurants and 3
+#otherwise, one less for sandwich shops and cafes, and N is 50 in the restaurant hotspot clusters
+#(0-3, a restaurant is in the lowest cluster of its neighborhoods) and 25 elsewhere.
+#
+#Every restaurant is rated with PRIORS when the bundle is compiled from the master table
+#(restaurantour_bundle.py). Run with:  python restaurantour_ratings.py updates.json
+#adds the {yelp_id: {'yelp_rating': ..., 'yelp_review_count': ...}} updates to the rating updates
+#of the bundle (RATING_UPDATES_FILE) and rebuilds it, which rescores only those restaurants.
+
+import os
+import sys
+import math
+import json
+import numpy as np
+from restaurantour_store import load_store, num_rests, PRICES, STORE_FILE
+from restaurantour_clusters import build_cluster_lookup, find_cluster
+
+PRIORS = {
+    'mu': 3.0, #prior mean rating
+    'price_mu': {'$': 2.0, '$$$$': 2.0}, #prior mean for these prices instead
+    'category_offsets': {'Sandwiches': -1.0, 'Cafes': -1.0}, #added to the prior mean (the lowest one if several apply)
+    'weight': 25.0, #prior weight, in reviews
+    'cluster_weights': {0: 50.0, 1: 50.0, 2: 50.0, 3: 50.0}, #prior weight in these clusters instead
+    'spread': 0.5, #standard deviation of the reviews around the rating
+    'max_rating': 5.0
+}
+
+#mean of a normal(rating, spread) review clipped to [0, max_rating]:
+def expected_review(ratings,spread,max_rating):
+    erf = np.vectorize(math.erf,otypes=[np.float64])
+    cdf = lambda x: 0.5 * (1 + erf(x / math.sqrt(2)))
+    pdf = lambda x: np.exp(-x * x / 2) / math.sqrt(2 * math.pi)
+    values, inverse = np.unique(np.asarray(ratings,dtype=np.float64),return_inverse=True) #Yelp ratings come in steps of 0.5
+    low, high = -values / spread, (max_rating - values) / spread
+    expected = (max_rating * (1 - cdf(high)) + values * (cdf(high) - cdf(low)) + spread * (pdf(low) - pdf(high)))
+    return expected[inverse]
+
+def bayes_average(ratings,counts,mu,weight):
+    return (ratings * counts + mu * weight) / (counts + weight)
+
+#min of table_values over each restaurant's entries (ids from offsets), NaN entries ignored,
+#NaN for restaurants without any:
+def segment_min(table_values,ids,offsets):
+    values = np.asarray(table_values,dtype=np.float64)[ids]
+    result = np.full(len(offsets) - 1,np.nan)
+    starts = offsets[:-1]
+    nonempty = offsets[1:] > starts
+    if len(values):
+        result[nonempty] = np.fmin.reduceat(values,starts[nonempty])
+    return result
+
+#cluster of each restaurant (NaN if none of its neighborhoods was clustered):
+def rest_clusters(store,cluster_lookup):
+    neigh_clusters = [find_cluster(cluster_lookup,neigh) for neigh in store['neighborhoods']]
+    neigh_clusters = [np.nan if cluster is None else cluster for cluster in neigh_clusters]
+    return segment_min(neigh_clusters,store['neigh_ids'],store['neigh_offsets'])
+
+def prior_means(store,priors=PRIORS):
+    price_mu = np.array([priors['mu']] + [priors['price_mu'].get(price,priors['mu']) for price in PRICES])
+    offsets = [priors['category_offsets'].get(category,np.nan) for category in store['categories']]
+    offsets = segment_min(offsets,store['cat_ids'],store['cat_offsets'])
+    return price_mu[store['price_code']] + np.nan_to_num(offsets)
+
+def prior_weights(store,cluster_lookup,priors=PRIORS):
+    clusters = rest_clusters(store,cluster_lookup)
+    weights = np.full(num_rests(store),priors['weight'])
+    for cluster, weight in priors['cluster_weights'].items():
+        weights[clusters == cluster] = weight
+    return weights
+
+#bayes_yelp_rating of the given rows (all restaurants by default):
+def compute_ratings(store,cluster_lookup,priors=PRIORS,rows=None):
+    rows = np.arange(num_rests(store)) if rows is None else np.asarray(rows,dtype=np.int64)
+    reviews = expected_review(store['yelp_rating'][rows],priors['spread'],priors['max_rating'])
+    return bayes_average(reviews,store['yelp_review_count'][rows],
+                         prior_means(store,priors)[rows],prior_weights(store,cluster_lookup,priors)[rows])
+
+#write the ratings of every restaurant into the store:
+def rescore_store(store,cluster_lookup,priors=PRIORS):
+    store['bayes_yelp_rating'] = compute_ratings(store,cluster_lookup,priors)
+    return store
+
+#new Yelp ratings and review counts for some restaurants ({yelp_id: {'yelp_rating': ...,
+#'yelp_review_count': ...}}, either field can be left out): only those rows are rescored.
+#Returns the row ids that changed:
+def update_ratings(store,cluster_lookup,updates,priors=PRIORS):
+    row_lookup = {yelp_id: row for row, yelp_id in enumerate(store['yelp_id'])}
+    rows = []
+    for yelp_id, fields in updates.items():
+        if yelp_id not in row_lookup:
+            raise KeyError('{} is not in the restaurant store'.format(yelp_id))
+        row = row_lookup[yelp_id]
+        if 'yelp_rating' in fields:
+            store['yelp_rating'][row] = fields['yelp_rating']
+        if 'yelp_review_count' in fields:
+            store['yelp_review_count'][row] = fields['yelp_review_count']
+        rows.append(row)
+    rows = np.array(rows,dtype=np.int64)
+    if len(rows):
+        store['bayes_yelp_rating'][rows] = compute_ratings(store,cluster_lookup,priors,rows)
+    return rows
+
+if __name__ == '__main__':
+    from restaurantour_bundle import build_bundle, RATING_UPDATES_FILE
+    from restaurantour_files import atomic_write
+    with open(sys.argv[1],'r') as f:
+        updates = json.load(f)
+    #checked before they are saved, an unknown id would fail every later build:
+    yelp_ids = set(load_store(STORE_FILE)['yelp_id'])
+    for yelp_id in updates:
+        if yelp_id not in yelp_ids:
+            raise KeyError('{} is not in the restaurant store'.format(yelp_id))
+    rating_updates = {}
+    if os.path.exists(RATING_UPDATES_FILE):
+        with open(RATING_UPDATES_FILE,'r') as f:
+            rating_updates = json.load(f)
+    for yelp_id, fields in updates.items():
+        rating_updates.setdefault(yelp_id,{}).update(fields)
+    with atomic_write(RATING_UPDATES_FILE,'w') as f:
+        json.dump(rating_updates,f,indent=1,sort_keys=True)
+    print('saved', len(updates), 'rating updates to', RATING_UPDATES_FILE)
+    build_bundle()
@@ -0,0 +1,73 @@
+#The Restaurantour - Startup Budget
+
+#Checks the app's startup path (everything before the first recommendation: the sidebar and
+#the landing page map) against an import-time budget. The path is run in a fresh interpreter
+#with python -X importtime, so earlier imports in this process do not hide its cost.
+#The startup path must not import numpy, pandas, folium or branca, nor load the restaurant data;
+#those wait for the first recommendation. streamlit itself is reported but not counted (the app
+#cannot start without it, and streamlit 1.14 already imports numpy and pandas on its own).
+#
+#Run with:  python restaurantour_startup.py   (exit status 1 if over budget)
+
+import sys
+import subprocess
+
+#seconds for the app's own startup imports and data loads (without streamlit):
+STARTUP_BUDGET = 0.25
+
+LAZY_MODULES = ['numpy', 'pandas', 'folium', 'branca', 'restaurantour_store', 'restaurantour_core']
+
+#same imports and loads as the top of restaurantour_app_deploy.py, plus the landing page map:
+STARTUP_CODE = '''
+import sys, time
+import streamlit
+before = set(sys.modules)
+start = time.perf_counter()
+from restaurantour_data import load_option_data, load_cluster_map_html
+import restaurantour_maps, restaurantour_cache, restaurantour_clusters
+load_option_data()
+load_cluster_map_html()
+print('elapsed', time.perf_counter() - start)
+print('loaded', ' '.join(name for name in {lazy} if name in sys.modules and name not in before))
+'''.format(lazy=LAZY_MODULES)
+
+#cumulative import time (seconds) of each top level module, from the -X importtime report:
+def parse_importtime(report):
+    times = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '): #top level import (nested ones are indented further)
+            times[name.strip()] = int(cumulative_us) / 1e6
+    return times
+
+def measure_startup():
+    result = subprocess.run([sys.executable,'-X','importtime','-c',STARTUP_CODE],
+                            capture_output=True,text=True,check=True)
+    measured = {'imports': parse_importtime(result.stderr)}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(' ')
+        if key == 'elapsed':
+            measured['elapsed'] = float(value)
+        elif key == 'loaded':
+            measured['lazy_loaded'] = value.split()
+    return measured
+
+#list of budget violations (empty when the startup path is within budget):
+def check_startup(measured,budget=STARTUP_BUDGET):
+    problems = []
+    if measured['elapsed'] > budget:
+        problems.append('startup took {:.3f}s, budget is {:.3f}s'.format(measured['elapsed'],budget))
+    for name in measured['lazy_loaded']:
+        problems.append(name + ' is imported at startup')
+    return problems
+
+if __name__ == '__main__':
+    measured = measure_startup()
+    print('streamlit import: {:.3f}s'.format(measured['imports'].get('streamlit',0)))
+    print('app startup: {:.3f}s (budget {:.3f}s)'.format(measured['elapsed'],STARTUP_BUDGET))
+    problems = check_startup(measured)
+    for problem in problems:
+        print('over budget:', problem)
+    sys.exit(1 if problems else 0)
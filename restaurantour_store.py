@@ -0,0 +1,268 @@
+#The Restaurantour - Restaurant Store
+
+#Columnar store holding each restaurant once. Replaces the three per-key pickles
+#(rest_neigh_dict, rest_cuisine_dict, rest_price_dict) which repeated the same records.
+#Numeric fields are typed arrays, string fields are kept in tables, and neighborhood,
+#cuisine and price become integer posting lists (row ids) into the store. The popup html of
+#each restaurant is precompiled into the store as well (see restaurantour_cards.py).
+#
+#On disk, the numeric columns, the posting lists and the long string columns are .npy files in
+#rest_columns/ (each posting field is one array of row ids plus the offsets of its keys, each
+#string column one utf-8 array plus the offsets of its rows), and the other fields are in
+#rest_store.json (see restaurantour_format.py). The .npy files are memory-mapped read-only by load_store, so the app
+#and API worker processes on one host share the same page cache pages instead of each loading a
+#copy. rest_store.json holds the sha256 of every column file, so it changes whenever a column does.
+
+import io
+import os
+import hashlib
+import warnings
+import numpy as np
+from restaurantour_cards import format_card, CARD_VERSION
+from restaurantour_format import data_bytes, read_data, DataFormatError
+
+#price codes: 0 = no price in database, 1-4 = '$' to '$$$$'
+PRICES = ['$','$$','$$$','$$$$']
+
+STORE_FILE = 'rest_store.json'
+COLUMNS_DIR = 'rest_columns' #next to STORE_FILE
+
+#memory-mapped columns, one value per row except the offsets (one more) and the category and
+#neighborhood ids (one per entry):
+NUMERIC_COLUMNS = ['lat','long','yelp_rating','bayes_yelp_rating','yelp_review_count','price_code',
+                   'neigh_ids','neigh_offsets','cat_ids','cat_offsets']
+ROW_COLUMNS = ['lat','long','yelp_rating','bayes_yelp_rating','yelp_review_count','price_code']
+POSTING_FIELDS = ['neigh_postings','cuisine_postings','price_postings']
+#strings, memory-mapped as utf-8 (see TextColumn):
+TEXT_COLUMNS = ['yelp_id','name','display_phone','cards']
+#fields kept in the json tables (the 'store' kind in restaurantour_format.py):
+TABLE_FIELDS = ['neighborhoods','categories','display_address','website','card_version']
+TABLE_ROW_FIELDS = ['display_address','website']
+
+COLUMN_DTYPES = {
+    'lat': np.float64,
+    'long': np.float64,
+    'yelp_rating': np.float64,
+    'bayes_yelp_rating': np.float64,
+    'yelp_review_count': np.int32,
+    'price_code': np.int8,
+    'neigh_ids': np.int32,
+    'neigh_offsets': np.int32,
+    'cat_ids': np.int32,
+    'cat_offsets': np.int32
+}
+for name in TEXT_COLUMNS:
+    COLUMN_DTYPES[name + '_text'] = np.uint8
+    COLUMN_DTYPES[name + '_offsets'] = np.int64
+for name in POSTING_FIELDS:
+    COLUMN_DTYPES[name + '_ids'] = np.int32
+    COLUMN_DTYPES[name + '_offsets'] = np.int64
+
+def price_to_code(price):
+    if price in PRICES:
+        return PRICES.index(price) + 1
+    return 0
+
+def code_to_price(code):
+    if code > 0:
+        return PRICES[code - 1]
+    return None
+
+def intern_strings(values,table,lookup):
+    ids = []
+    for value in values:
+        if value not in lookup:
+            lookup[value] = len(table)
+            table.append(value)
+        ids.append(lookup[value])
+    return ids
+
+#build the store from the per-key rest dicts of the ratings adjustment notebook (lists of
+#restaurant records, with the notebook's ratings):
+def build_store(rest_neigh_dict,rest_cuisine_dict,rest_price_dict):
+    row_lookup = {} #yelp_id -> row id
+    records = []
+    postings = {}
+    for name, rest_dict in [('neigh_postings',rest_neigh_dict),
+                            ('cuisine_postings',rest_cuisine_dict),
+                            ('price_postings',rest_price_dict)]:
+        postings[name] = {}
+        for key, rests in rest_dict.items():
+            ids = []
+            for rest in rests:
+                if rest['yelp_id'] not in row_lookup:
+                    row_lookup[rest['yelp_id']] = len(records)
+                    records.append(rest)
+                ids.append(row_lookup[rest['yelp_id']])
+            #keep the original list order so ties rank the same way as before
+            postings[name][key] = np.array(ids,dtype=np.int32)
+    return store_from_records(records,postings)
+
+#store of the restaurant records (one per restaurant, row ids in list order), postings are
+#{'neigh_postings': {neighborhood: row ids}, 'cuisine_postings': ..., 'price_postings': ...}:
+def store_from_records(records,postings):
+    neighborhoods, neigh_lookup, neigh_ids, neigh_offsets = [], {}, [], [0]
+    categories, cat_lookup, cat_ids, cat_offsets = [], {}, [], [0]
+    for rest in records:
+        neigh_ids += intern_strings(rest['neighborhood'],neighborhoods,neigh_lookup)
+        neigh_offsets.append(len(neigh_ids))
+        cat_ids += intern_strings(rest['categories'],categories,cat_lookup)
+        cat_offsets.append(len(cat_ids))
+
+    store = {
+        'yelp_id': [rest['yelp_id'] for rest in records],
+        'name': [rest['name'] for rest in records],
+        'lat': np.array([rest['lat'] for rest in records],dtype=np.float64),
+        'long': np.array([rest['long'] for rest in records],dtype=np.float64),
+        'yelp_rating': np.array([rest['yelp_rating'] for rest in records],dtype=np.float64),
+        'bayes_yelp_rating': np.array([rest['bayes_yelp_rating'] for rest in records],dtype=np.float64),
+        'yelp_review_count': np.array([rest['yelp_review_count'] for rest in records],dtype=np.int32),
+        'price_code': np.array([price_to_code(rest['price']) for rest in records],dtype=np.int8),
+        'neighborhoods': neighborhoods,
+        'neigh_ids': np.array(neigh_ids,dtype=np.int32),
+        'neigh_offsets': np.array(neigh_offsets,dtype=np.int32),
+        'categories': categories,
+        'cat_ids': np.array(cat_ids,dtype=np.int32),
+        'cat_offsets': np.array(cat_offsets,dtype=np.int32),
+        'display_address': [list(rest['display_address']) for rest in records],
+        'display_phone': [rest['display_phone'] for rest in records],
+        #missing websites are stored as None instead of NaN
+        'website': [rest['website'] if isinstance(rest['website'],str) else None for rest in records]
+    }
+    for name, key_postings in postings.items():
+        store[name] = {key: np.asarray(ids,dtype=np.int32) for key, ids in key_postings.items()}
+    add_cards(store)
+    return store
+
+#precompiled popup html by row id, tagged with the card version it was built with:
+def add_cards(store):
+    store['cards'] = [format_card(rest) for rest in get_records(store,range(num_rests(store)))]
+    store['card_version'] = CARD_VERSION
+    return store
+
+#stale cards (built with another card version) are rebuilt in memory:
+def check_cards(store,path=STORE_FILE):
+    if store.get('card_version') != CARD_VERSION:
+        warnings.warn('{} has stale hover cards (version {}, current {}), rebuild it with python restaurantour_bundle.py'
+                      .format(path,store.get('card_version'),CARD_VERSION))
+        add_cards(store)
+    return store
+
+#.npy format 3.0 (read by numpy 1.17 and later), whose header numpy parses without the slower
+#compatibility filter of the 1.0 and 2.0 headers:
+def npy_bytes(array):
+    buffer = io.BytesIO()
+    np.lib.format.write_array(buffer,np.ascontiguousarray(array),version=(3,0),allow_pickle=False)
+    return buffer.getvalue()
+
+def column_file(name):
+    return COLUMNS_DIR + '/' + name + '.npy'
+
+#strings stored as one utf-8 array and the offsets of each string, decoded when a row is read:
+class TextColumn:
+    def __init__(self,text,offsets):
+        self.text = text
+        self.offsets = offsets.tolist()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self,row):
+        return self.text[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+def text_arrays(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.cumsum([0] + [len(data) for data in encoded]).astype(np.int64)
+    return np.frombuffer(b''.join(encoded),dtype=np.uint8), offsets
+
+#read-only memory map of a column file (or an in-memory copy), refused if it has another dtype.
+#The map is returned as a plain ndarray view, which is much faster to slice than np.memmap:
+def load_column(directory,name,dtype,mmap=True):
+    path = os.path.join(directory,column_file(name))
+    column = np.load(path,mmap_mode='r' if mmap else None,allow_pickle=False)
+    if column.dtype != dtype:
+        raise DataFormatError('{} has dtype {}, expected {}'.format(path,column.dtype,np.dtype(dtype)))
+    return np.asarray(column)
+
+#contents of the store files ({path relative to the directory of STORE_FILE: bytes}), the
+#json tables last:
+def store_files(store,path=STORE_FILE):
+    files = {}
+    for column in NUMERIC_COLUMNS:
+        files[column_file(column)] = npy_bytes(np.asarray(store[column],dtype=COLUMN_DTYPES[column]))
+    posting_keys = {}
+    for name in POSTING_FIELDS:
+        keys = list(store[name])
+        lists = [store[name][key] for key in keys]
+        offsets = np.cumsum([0] + [len(ids) for ids in lists]).astype(np.int64)
+        ids = np.concatenate(lists).astype(np.int32) if lists else np.zeros(0,dtype=np.int32)
+        files[column_file(name + '_ids')] = npy_bytes(ids)
+        files[column_file(name + '_offsets')] = npy_bytes(offsets)
+        posting_keys[name] = keys
+    for name in TEXT_COLUMNS:
+        text, offsets = text_arrays(store[name])
+        files[column_file(name + '_text')] = npy_bytes(text)
+        files[column_file(name + '_offsets')] = npy_bytes(offsets)
+    tables = {field: store[field] for field in TABLE_FIELDS}
+    tables['posting_keys'] = posting_keys
+    tables['column_hashes'] = {name: hashlib.sha256(data).hexdigest() for name, data in files.items()}
+    files[os.path.basename(path)] = data_bytes('store',tables)
+    return files
+
+#numeric columns, posting lists and cards are read-only memory maps unless mmap is False (for the
+#build steps that change the ratings in place). Raises DataFormatError if the files do not
+#match the store format:
+def load_store(path=STORE_FILE,mmap=True):
+    store = read_data(path,'store')
+    directory = os.path.dirname(path)
+    load = lambda name: load_column(directory,name,COLUMN_DTYPES[name],mmap)
+    for column in NUMERIC_COLUMNS:
+        store[column] = load(column)
+    for name, keys in store.pop('posting_keys').items():
+        ids, offsets = load(name + '_ids'), load(name + '_offsets').tolist()
+        store[name] = {key: ids[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+    for name in TEXT_COLUMNS:
+        store[name] = TextColumn(load(name + '_text'),load(name + '_offsets'))
+    store.pop('column_hashes')
+    rows = num_rests(store)
+    if (any(len(store[column]) != rows for column in ROW_COLUMNS + TEXT_COLUMNS + TABLE_ROW_FIELDS)
+            or len(store['neigh_offsets']) != rows + 1 or len(store['cat_offsets']) != rows + 1):
+        raise DataFormatError('the column files in {} do not match {} ({} restaurants)'
+                              .format(os.path.join(directory,COLUMNS_DIR),path,rows))
+    return check_cards(store,path)
+
+def num_rests(store):
+    return len(store['yelp_id'])
+
+def get_neighborhoods(store,row):
+    start, end = store['neigh_offsets'][row], store['neigh_offsets'][row + 1]
+    return [store['neighborhoods'][i] for i in store['neigh_ids'][start:end]]
+
+def get_categories(store,row):
+    start, end = store['cat_offsets'][row], store['cat_offsets'][row + 1]
+    return [store['categories'][i] for i in store['cat_ids'][start:end]]
+
+#rebuild restaurant records (same fields the app used from the rest dicts) for the given row ids:
+def get_records(store,ids):
+    records = []
+    for row in ids:
+        records.append({
+            'yelp_id': store['yelp_id'][row],
+            'name': store['name'][row],
+            'neighborhood': get_neighborhoods(store,row),
+            'categories': get_categories(store,row),
+            'price': code_to_price(store['price_code'][row]),
+            'yelp_rating': float(store['yelp_rating'][row]),
+            'yelp_review_count': int(store['yelp_review_count'][row]),
+            'bayes_yelp_rating': float(store['bayes_yelp_rating'][row]),
+            'lat': float(store['lat'][row]),
+            'long': float(store['long'][row]),
+            'display_address': store['display_address'][row],
+            'display_phone': store['display_phone'][row],
+            'website': store['website'][row]
+        })
+    return records